@@ -113,6 +113,43 @@ weld_value_memory_usage(weld_value_t obj);
 extern "C" weld_module_t
 weld_module_compile(const char *code, weld_conf_t, weld_error_t);
 
+/**
+ * Loads a Weld module from the optimized LLVM IR of a module previously
+ * compiled from the same code.
+ *
+ * Unlike `weld_module_compile`, this does not run any optimization passes or
+ * code generation.
+ *
+ * @param code the Weld program the module was compiled from.
+ * @param llvm_ir the IR returned by `weld_module_llvm_ir` for that module.
+ * @param conf a configuration for the module.
+ * @param err will hold any error raised while loading.
+ * @return a runnable module.
+ */
+extern "C" weld_module_t
+weld_module_load(const char *code, const char *llvm_ir, weld_conf_t, weld_error_t);
+
+/**
+ * Returns the optimized LLVM IR of a module.
+ *
+ * @param module the module.
+ * @return the IR, or NULL if the module was compiled without
+ * `weld.compile.exportLLVM` set. The string is owned by the module.
+ */
+extern "C" const char *
+weld_module_llvm_ir(weld_module_t module);
+
+/**
+ * Returns the compilation statistics of a module.
+ *
+ * @param module the module.
+ * @return one `<category>\t<name>\t<microseconds>` line per timed step,
+ * where the category is `weld` (compiler phases), `passes` (optimization
+ * passes) or `llvm` (LLVM stages). The string is owned by the module.
+ */
+extern "C" const char *
+weld_module_stats(weld_module_t module);
+
 /**
  * Runs a module using the given argument.
  *
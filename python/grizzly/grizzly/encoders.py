@@ -5,6 +5,7 @@ Attributes:
 """
 
 from weld.weldobject import *
+from weld.encoders import weld_to_numpy_array
 import numpy as np
 import os
 import sys
@@ -20,6 +21,47 @@ numpy_to_weld_type_mapping = {
     'bool': WeldBit()
 }
 
+# NumPy dtypes of the Weld vectors which are decoded without copying.
+numeric_weld_vec_dtypes = {
+    WeldVec(WeldBit()): np.bool_,
+    WeldVec(WeldInt()): np.int32,
+    WeldVec(WeldLong()): np.int64,
+    WeldVec(WeldFloat()): np.float32,
+    WeldVec(WeldDouble()): np.float64,
+}
+
+# NumPy dtypes of scalar Weld types.
+scalar_weld_dtypes = {
+    WeldBit(): np.bool_,
+    WeldChar(): np.int8,
+    WeldInt(): np.int32,
+    WeldLong(): np.int64,
+    WeldFloat(): np.float32,
+    WeldDouble(): np.float64,
+}
+
+
+def weld_to_numpy_dtype(weld_type):
+    """
+    Returns the NumPy dtype with the same memory layout as `weld_type`.
+
+    Structs become aligned structured dtypes with fields f0, f1, ...; vectors
+    become (ptr, size) records, the address and length of their buffer.
+
+    Args:
+        weld_type (WeldType): A scalar, struct or vector type
+
+    Returns:
+        np.dtype: The corresponding dtype
+    """
+    if isinstance(weld_type, WeldStruct):
+        return np.dtype([("f%d" % i, weld_to_numpy_dtype(field_type))
+                         for i, field_type in enumerate(weld_type.field_types)],
+                        align=True)
+    elif isinstance(weld_type, WeldVec):
+        return np.dtype([("ptr", np.uintp), ("size", np.int64)], align=True)
+    return np.dtype(scalar_weld_dtypes[weld_type])
+
 
 def to_shared_lib(name):
     """
@@ -137,7 +179,9 @@ class NumPyDecoder(WeldObjectDecoder):
         lib_file = pkg_resources.resource_filename(__name__, lib)
         self.utils = ctypes.PyDLL(lib_file)
 
-    def decode(self, obj, restype, raw_ptr=False):
+    takes_ownership = True
+
+    def decode(self, obj, restype, raw_ptr=False, owner=None):
         """Converts Weld object to Python object.
 
         Args:
@@ -145,6 +189,8 @@ class NumPyDecoder(WeldObjectDecoder):
             restype: Type of Weld computation result
             raw_ptr: Boolean indicating whether obj needs to be extracted
                      from WeldValue or not
+            owner: ResultOwner of the Weld value, kept alive by arrays which
+                   view its memory
 
         Returns:
             Python object representing result of the Weld computation
@@ -152,35 +198,35 @@ class NumPyDecoder(WeldObjectDecoder):
         if raw_ptr:
             data = obj
         else:
-            data = cweld.WeldValue(obj).data()
+            data = ctypes.cast(obj, ctypes.c_void_p).value
         result = ctypes.cast(data, ctypes.POINTER(restype.ctype_class)).contents
 
-        if restype == WeldInt():
-            data = cweld.WeldValue(obj).data()
-            result = ctypes.cast(data, ctypes.POINTER(c_int)).contents.value
-            return result
-        elif restype == WeldLong():
-            data = cweld.WeldValue(obj).data()
-            result = ctypes.cast(data, ctypes.POINTER(c_long)).contents.value
-            return result
-        elif restype == WeldFloat():
-            data = cweld.WeldValue(obj).data()
-            result = ctypes.cast(data, ctypes.POINTER(c_float)).contents.value
-            return float(result)
-        elif restype == WeldDouble():
-            data = cweld.WeldValue(obj).data()
-            result = ctypes.cast(data, ctypes.POINTER(c_double)).contents.value
-            return float(result)
+        # Scalars are read straight from the result.
+        if restype == WeldInt() or restype == WeldLong():
+            return result.value
+        elif restype == WeldFloat() or restype == WeldDouble():
+            return float(result.value)
+
+        # Vectors of scalars are viewed without copying; the arrays keep the
+        # Weld value alive through its owner.
+        if restype in numeric_weld_vec_dtypes:
+            address = ctypes.cast(result.ptr, ctypes.c_void_p).value
+            return weld_to_numpy_array(
+                address, (result.size,), numeric_weld_vec_dtypes[restype],
+                owner)
+
+        # Vectors of structs are viewed as structured arrays without copying,
+        # so any field can be read without projecting it in Weld.
+        if isinstance(restype, WeldVec) and \
+                isinstance(restype.elemType, WeldStruct):
+            address = ctypes.cast(result.ptr, ctypes.c_void_p).value
+            return weld_to_numpy_array(
+                address, (result.size,), weld_to_numpy_dtype(restype.elemType),
+                owner)
 
         # Obj is a WeldVec(WeldInt()).ctype_class, which is a subclass of
         # ctypes._structure
-        if restype == WeldVec(WeldBit()):
-            weld_to_numpy = self.utils.weld_to_numpy_bool_arr
-        elif restype == WeldVec(WeldFloat()):
-            weld_to_numpy = self.utils.weld_to_numpy_float_arr
-        elif restype == WeldVec(WeldDouble()):
-            weld_to_numpy = self.utils.weld_to_numpy_double_arr
-        elif restype == WeldVec(WeldVec(WeldChar())):
+        if restype == WeldVec(WeldVec(WeldChar())):
             weld_to_numpy = self.utils.weld_to_numpy_char_arr_arr
         elif restype == WeldVec(WeldVec(WeldInt())):
             weld_to_numpy = self.utils.weld_to_numpy_int_arr_arr
@@ -190,14 +236,13 @@ class NumPyDecoder(WeldObjectDecoder):
             weld_to_numpy = self.utils.weld_to_numpy_float_arr_arr
         elif restype == WeldVec(WeldVec(WeldDouble())):
             weld_to_numpy = self.utils.weld_to_numpy_double_arr_arr
-        elif restype == WeldVec(WeldInt()):
-            weld_to_numpy = self.utils.weld_to_numpy_int_arr
         elif isinstance(restype, WeldStruct):
             ret_vecs = []
             # Iterate through all fields in the struct, and recursively call
             # decode.
             for field_type in restype.field_types:
-                ret_vec = self.decode(data, field_type, raw_ptr=True)
+                ret_vec = self.decode(data, field_type, raw_ptr=True,
+                                      owner=owner)
                 data += sizeof(field_type.ctype_class())
                 ret_vecs.append(ret_vec)
             return tuple(ret_vecs)
@@ -209,3 +254,27 @@ class NumPyDecoder(WeldObjectDecoder):
 
         ret_vec = weld_to_numpy(result)
         return ret_vec
+
+    def decode_vec_field(self, field, field_type):
+        """Decodes a vector field of a structured array returned by decode.
+
+        Vector fields are (ptr, size) records, laid out like the vectors
+        themselves, so the records are copied next to each other and decoded
+        as a vector of vectors.
+
+        Args:
+            field: Field of a structured array, of dtype
+                   weld_to_numpy_dtype(field_type)
+            field_type (WeldVec): Weld type of the field
+
+        Returns:
+            Python object representing the vectors of the field
+        """
+        vecs = np.ascontiguousarray(field)
+        restype = WeldVec(field_type)
+        result = restype.ctype_class()
+        result.ptr = ctypes.cast(vecs.ctypes.data,
+                                 ctypes.POINTER(field_type.ctype_class))
+        result.size = len(vecs)
+        # The decoded values are copies, so vecs may be freed afterwards.
+        return self.decode(ctypes.pointer(result), restype)
@@ -227,46 +227,34 @@ class GroupedDataFrameWeld(LazyOpResult):
             column_types = WeldStruct(self.column_types)
         self.weld_type = WeldStruct([self.grouping_column_type, column_types])
 
-    def get_column(self, column_name, column_type, index, verbose=True):
+    def evaluate(self, verbose=False):
         """Summary
 
-        Args:
-            column_name (TYPE): Description
-            column_type (TYPE): Description
-            index (TYPE): Description
-
         Returns:
             TYPE: Description
         """
-        return LazyOpResult(
-            grizzly_impl.get_column(
-                self.expr,
-                self.weld_type,
-                index
-            ),
-            column_type,
+        # The groups are decoded into a structured array viewing Weld's
+        # result, so the aggregated columns are read without running a Weld
+        # program per column. Vector fields (e.g., strings) are only
+        # (ptr, size) records in the structured array, so they are decoded
+        # column by column.
+        groups = LazyOpResult(
+            self.expr,
+            self.weld_type,
             1
         ).evaluate(verbose=verbose)
-
-    def evaluate(self, verbose=True):
-        """Summary
-
-        Returns:
-            TYPE: Description
-        """
+        values = groups["f1"]
         df = pd.DataFrame(columns=[])
         i = 0
         for column_name in self.column_names:
             if len(self.column_names) > 1:
-                index = "1.%d" % i
+                column = values["f%d" % i]
             else:
-                index = "1"
-            df[column_name] = self.get_column(
-                column_name,
-                self.column_types[i],
-                index,
-                verbose=verbose
-            )
+                column = values
+            if isinstance(self.column_types[i], WeldVec):
+                column = grizzly_impl.decoder_.decode_vec_field(
+                    column, self.column_types[i])
+            df[column_name] = column
             i += 1
         return DataFrameWeld(df)
 
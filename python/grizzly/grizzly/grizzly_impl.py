@@ -236,14 +236,18 @@ def compare(array, other, op, ty_str):
         weld_obj.dependencies[array_var] = array
 
     # Strings need to be encoded into vec[char] array.
-    # Constants can be added directly to NVL snippet.
+    # Constants are added as literals (or arguments, if literals are hoisted).
     if isinstance(other, str) or isinstance(other, WeldObject):
         other_var = weld_obj.update(other)
         if isinstance(other, WeldObject):
             other_var = tmp.obj_id
             weld_obj.dependencies[other_var] = other
     else:
-        other_var = "%s(%s)" % (ty_str, str(other))
+        if isinstance(other, (int, long, np.integer)):
+            other_ty = WeldLong()
+        else:
+            other_ty = WeldDouble()
+        other_var = "%s(%s)" % (ty_str, weld_obj.literal(other, other_ty))
 
     weld_template = """
        map(
@@ -378,34 +382,3 @@ def groupby_sum(columns, column_tys, grouping_column):
                                           "ty": tys_str}
     return weld_obj
 
-
-def get_column(columns, column_tys, index):
-    """
-    Get column corresponding to passed-in index from ptr returned
-    by groupBySum.
-
-    Args:
-        columns (List<WeldObject>): List of columns as WeldObjects
-        column_tys (List<str>): List of each column data ty
-        index (int): index of selected column
-
-    Returns:
-        A WeldObject representing this computation
-    """
-    weld_obj = WeldObject(encoder_, decoder_)
-    columns_var = weld_obj.update(columns, tys=WeldVec(column_tys), override=False)
-    if isinstance(columns, WeldObject):
-        columns_var = columns.obj_id
-        weld_obj.dependencies[columns_var] = columns
-
-    weld_template = """
-     map(
-       %(columns)s,
-       |elem: %(ty)s| elem.$%(index)s
-     )
-  """
-
-    weld_obj.weld_code = weld_template % {"columns": columns_var,
-                                          "ty": column_tys,
-                                          "index": index}
-    return weld_obj
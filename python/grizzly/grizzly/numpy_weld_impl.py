@@ -36,7 +36,7 @@ def div(array, other, ty):
         other_var = other.obj_id
         weld_obj.dependencies[other_var] = other
     else:
-        other_var = ("%.2f" % other)
+        other_var = weld_obj.literal(other, WeldDouble())
 
     weld_template = """
        map(
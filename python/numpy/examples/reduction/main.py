@@ -0,0 +1,54 @@
+import numpy as np
+import time
+from weldnumpy import weldarray
+import weldnumpy as wn
+import argparse
+
+# Reductions fused with the ops producing their values: Weld computes
+# np.sum(np.exp(a) * b) in a single loop, with no intermediate arrays, and
+# parallelizes it with weldnumpy.num_threads threads (all the CPUs, unless
+# WELD_NUM_THREADS is set).
+
+def fused_sum(a, b):
+    return np.sum(np.exp(a) * b)
+
+def fused_sum_axis(a, b, axis):
+    return np.add.reduce(np.exp(a) * b, axis=axis)
+
+def run(args):
+    np.random.seed(1)
+    shape = (args.num_els / args.cols, args.cols)
+    a = np.random.rand(*shape)
+    b = np.random.rand(*shape)
+    print('shape: ', shape)
+
+    start = time.time()
+    n_sum = fused_sum(a, b)
+    n_axis = fused_sum_axis(a, b, args.axis)
+    print('****************************')
+    print('numpy took {} seconds'.format(time.time() - start))
+    print('****************************')
+
+    wa = weldarray(a)
+    wb = weldarray(b)
+    start = time.time()
+    w_sum = fused_sum(wa, wb)
+    w_axis = fused_sum_axis(wa, wb, args.axis).evaluate()
+    print('****************************')
+    print('weld took {} seconds'.format(time.time() - start))
+    print('****************************')
+
+    assert np.allclose(n_sum, w_sum)
+    assert np.allclose(n_axis, w_axis)
+
+parser = argparse.ArgumentParser(
+    description="fused reductions: np.sum(np.exp(a) * b)"
+)
+parser.add_argument('-n', "--num_els", type=int, default=100000000,
+                    help="number of elements in each array")
+parser.add_argument('-c', "--cols", type=int, default=1000,
+                    help="number of columns of the arrays")
+parser.add_argument('-a', "--axis", type=int, default=0,
+                    help="axis of the second reduction")
+args = parser.parse_args()
+run(args)
@@ -719,6 +719,36 @@ def test_setitem_list():
     w[a] = [5.0, 13.0]
     assert np.allclose(n, w)
 
+def test_setitem_lazy():
+    '''
+    without offloading setitem to NumPy, slice and fancy index assignments
+    are registered lazily, as a single pass over the array.
+    '''
+    import weldnumpy.weldnumpy as wn
+    wn.set_offload_setitem(False)
+    try:
+        n, w = random_arrays(1000, 'float64')
+        n = np.exp(n)
+        w = np.exp(w)
+        n[100:900:3] = np.arange(267)
+        w[100:900:3] = np.arange(267)
+        n[[5, 1, 5, -2]] = [1.0, 2.0, 3.0, 4.0]
+        w[[5, 1, 5, -2]] = [1.0, 2.0, 3.0, 4.0]
+        n[n > 20.0] = 0.5
+        w[w > 20.0] = 0.5
+        assert isinstance(w, weldarray)
+        assert np.allclose(n, w.evaluate())
+
+        n, w = random_arrays(NUM_ELS, 'float32')
+        n2 = n[2:8]
+        w2 = w[2:8]
+        n2[1:5:2] = 7.0
+        w2[1:5:2] = 7.0
+        assert np.allclose(n, w.evaluate())
+        assert np.allclose(n2, w2.evaluate())
+    finally:
+        wn.set_offload_setitem(True)
+
 def test_setitem_weird_indexing():
     '''
     try to confuse the weldarray with different indexing patterns.
@@ -912,6 +942,29 @@ def test_unsupported_ndarray_output():
     n2 = np.exp(w, out=n2)
     assert np.allclose(n,n2)
 
+def test_ndarray_inputs():
+    '''
+    ops between weldarrays and contiguous ndarrays should stay lazy, with the
+    ndarray added to the weldobject without copying it.
+    '''
+    n, w = random_arrays(NUM_ELS, 'float64')
+    n2 = np.random.rand(NUM_ELS)
+
+    n3 = np.sqrt(n2 * np.exp(n)) + n2
+    w3 = np.sqrt(n2 * np.exp(w)) + n2
+    assert isinstance(w3, weldarray)
+    assert any(v is n2 for v in w3.weldobj.context.values())
+    assert np.allclose(n3, w3.evaluate())
+
+    # non-contiguous ndarrays are offloaded to NumPy.
+    n4 = np.random.rand(NUM_ELS*2)[::2]
+    assert np.allclose(n + n4, w + n4)
+
+    # so are 0-d ndarrays.
+    n5 = np.array(2.0)
+    assert np.allclose(n + n5, w + n5)
+    assert np.allclose(n5 * n, n5 * w)
+
 def test_new_array_creation():
     '''
     Creating new array with an op should leave the value in the old array unchanged.
@@ -1076,6 +1129,36 @@ def test_non_matching_types():
 
     np.allclose(n, w)
 
+def test_mixed_types():
+    '''
+    ops on arrays and scalars of different types follow NumPy's type
+    promotion, and are not offloaded to NumPy.
+    '''
+    n32, w32 = random_arrays(NUM_ELS, 'float32')
+    n64, w64 = random_arrays(NUM_ELS, 'float64')
+    ni, wi = random_arrays(NUM_ELS, 'int64')
+
+    for op in [np.add, np.subtract, np.multiply, np.divide]:
+        n = op(n32, n64)
+        w = op(w32, w64)
+        assert isinstance(w, weldarray)
+        assert w.dtype == n.dtype
+        w = w.evaluate()
+        assert w.dtype == n.dtype
+        assert np.allclose(n, w)
+
+    n = np.exp(ni * 0.5) + n32
+    w = np.exp(wi * 0.5) + w32
+    assert isinstance(w, weldarray)
+    w = w.evaluate()
+    assert w.dtype == n.dtype
+    assert np.allclose(n, w)
+
+    n = n32 * 2.5
+    w = w32 * 2.5
+    assert w.dtype == n.dtype
+    assert np.allclose(n, w.evaluate())
+
 def test_let_sorting():
     '''
     FIXME: test doesn't quite test what is needed.
@@ -1129,3 +1212,55 @@ def test_util_functions():
         nmax = f(n)
         wmax = f(w)
         assert nmax == wmax
+
+def test_tiered():
+    '''
+    With tiered execution, the first evaluation of a program runs with NumPy
+    while it compiles, and later ones use the compiled module.
+    '''
+    import time
+    import weldnumpy.weldnumpy as wn
+    wn.set_tiered(True)
+    try:
+        results = []
+        for i in range(3):
+            n, w = random_arrays(NUM_ELS, 'float64')
+            n = np.exp(n) * n + 2.0
+            w = np.exp(w) * w + 2.0
+            assert w._numpy_thunk is not None
+            weldobj = w.weldobj
+            results.append((n, w.evaluate()))
+            # wait for the background compilation.
+            deadline = time.time() + 60
+            while not wn.weld_module_ready(weldobj, wn.CUR_PASSES):
+                assert time.time() < deadline, 'background compilation timed out'
+                time.sleep(0.05)
+        for n, w in results:
+            assert np.allclose(n, w)
+    finally:
+        wn.set_tiered(False)
+
+def test_tiered_reduce():
+    '''
+    With tiered execution, a reduction to a scalar is computed with NumPy while
+    its program compiles in the background, instead of compiling it first.
+    '''
+    import time
+    import weldnumpy.weldnumpy as wn
+    from weld import cache
+    wn.set_tiered(True)
+    try:
+        n, w = random_arrays(NUM_ELS, 'float64')
+        n = np.exp(n) * 3.25
+        w = np.exp(w) * 3.25
+        misses = cache.module_cache.misses
+        assert np.allclose(np.sum(n), np.sum(w))
+        # the program was not looked up (and compiled) in the foreground.
+        assert cache.module_cache.misses == misses
+        deadline = time.time() + 60
+        while len(wn._compiling) > 0:
+            assert time.time() < deadline, 'background compilation timed out'
+            time.sleep(0.05)
+        assert np.allclose(np.sum(n), np.sum(w))
+    finally:
+        wn.set_tiered(False)
@@ -559,6 +559,52 @@ def test_broadcasting_bug():
     assert np.allclose(w3, w4)
     assert np.allclose(w4, n3)
 
+def test_broadcasting_lazy():
+    '''
+    broadcast ops are registered lazily, and fuse with the ops around them.
+    '''
+    n, w = random_arrays(50, 'float64')
+    n2, w2 = random_arrays((4,50), 'float64')
+
+    n3 = np.sqrt(n[:, None] - n[None, :]) * 2.0
+    w3 = np.sqrt(w[:, None] - w[None, :]) * 2.0
+    assert isinstance(w3, weldarray)
+    w3 = w3.evaluate()
+    assert w3.shape == n3.shape
+    assert np.allclose(w3, n3, equal_nan=True)
+
+    n4 = np.exp(n2) / n
+    w4 = np.exp(w2) / w
+    assert isinstance(w4, weldarray)
+    w4 = w4.evaluate()
+    assert w4.shape == n4.shape
+    assert np.allclose(w4, n4)
+
+def test_broadcasting_lazy_shape():
+    '''
+    lazy broadcast results have the broadcast shape before they are
+    evaluated, and keep it when other ops are registered on them.
+    '''
+    n, w = random_arrays(6, 'float64')
+
+    n2 = n[:, None] - n[None, :]
+    w2 = w[:, None] - w[None, :]
+    assert w2.shape == n2.shape
+    assert len(w2) == len(n2)
+
+    n3 = np.sqrt(n2 * n2) * 2.0
+    w3 = np.sqrt(w2 * w2) * 2.0
+    assert isinstance(w3, weldarray)
+    assert w3.shape == n3.shape
+    assert w3._real_shape == n3.shape
+
+    w4 = weldarray(w3) + 1.0
+    n4 = n3 + 1.0
+    assert w4.shape == n4.shape
+    w4 = w4.evaluate()
+    assert w4.shape == n4.shape
+    assert np.allclose(w4, n4)
+
 def test_broadcasting_nbody_bug():
     '''
     Transpose + broadcasting --> shapes don't seem to match.
@@ -604,6 +650,86 @@ def test_sum_axis1_simple():
     w2 = w2.evaluate()
     assert np.allclose(w2, n2)
 
+def test_reduce_axes():
+    '''
+    reductions over each axis of N-d arrays, fused with the registered ops.
+    '''
+    for shape in SHAPES[1:]:
+        for r in REDUCE_UFUNCS:
+            for axis in range(-1, len(shape)):
+                for dtype in ['float64', 'int32']:
+                    n, w = random_arrays(shape, dtype)
+                    if 'float' in dtype:
+                        n2 = r(np.sqrt(n), axis=axis)
+                        w2 = r(np.sqrt(w), axis=axis)
+                    else:
+                        n2 = r(n * 2, axis=axis)
+                        w2 = r(w * 2, axis=axis)
+                    assert isinstance(w2, weldarray)
+                    assert w2.dtype == n2.dtype
+                    w2 = w2.evaluate()
+                    assert w2.dtype == n2.dtype
+                    assert w2.shape == n2.shape
+                    assert np.allclose(w2, n2)
+
+def test_reduce_all_axes():
+    '''
+    reductions over all axes return scalars, as in NumPy.
+    '''
+    for shape in SHAPES:
+        n, w = random_arrays(shape, 'float64')
+        n2, w2 = random_arrays(shape, 'float64')
+        assert np.allclose(np.sum(np.exp(n) * n2), np.sum(np.exp(w) * w2))
+        assert np.allclose(np.add.reduce(n, axis=None), np.add.reduce(w, axis=None))
+        assert np.allclose(np.sum(n, axis=tuple(range(n.ndim))),
+                           np.sum(w, axis=tuple(range(w.ndim))))
+
+        # int32 values are accumulated in int64, as in NumPy.
+        n, w = random_arrays(shape, 'int32')
+        for r in [np.sum, np.prod]:
+            n2 = r(n)
+            w2 = r(w)
+            assert w2.dtype == n2.dtype
+            assert w2 == n2
+
+def test_reduce_axis_chained():
+    '''
+    ops registered on the result of a reduction see its reduced shape.
+    '''
+    n, w = random_arrays((4,5), 'float64')
+    n2 = np.sqrt(np.sum(n, axis=1)) * 2.0
+    w2 = np.sqrt(np.sum(w, axis=1)) * 2.0
+    assert w2.shape == n2.shape
+    w2 = w2.evaluate()
+    assert w2.shape == n2.shape
+    assert np.allclose(w2, n2)
+
+    # reductions over several (but not all) axes are done by NumPy.
+    n, w = random_arrays((3,4,5), 'float64')
+    n2 = np.sum(np.exp(n), axis=(0,2))
+    w2 = np.sum(np.exp(w), axis=(0,2))
+    assert w2.shape == n2.shape
+    assert np.allclose(w2, n2)
+
+def test_reduce_threads():
+    num_threads = wn.num_threads
+    try:
+        for threads in [1, 4]:
+            wn.set_num_threads(threads)
+            n, w = random_arrays((40,50), 'float64')
+            assert np.allclose(np.sum(np.exp(n) * n), np.sum(np.exp(w) * w))
+            w2 = np.add.reduce(np.exp(w), axis=1).evaluate()
+            assert np.allclose(w2, np.add.reduce(np.exp(n), axis=1))
+    finally:
+        wn.set_num_threads(num_threads)
+
+def test_reduce_non_contiguous():
+    n, w = random_arrays((6,8), 'float64')
+    n2 = np.add.reduce(n[::2, 1::3], axis=0)
+    w2 = np.add.reduce(w[::2, 1::3], axis=0)
+    w2 = w2.evaluate()
+    assert np.allclose(w2, n2)
+
 def test_ops_axis():
     pass
 
@@ -633,6 +759,43 @@ def test_diagonal_setitem():
     assert np.array_equal(n2, w2)
     assert np.array_equal(n, w)
 
+def test_setitem_lazy_sparse():
+    '''
+    lazy assignments to a few elements of an array don't add inputs as large
+    as the array.
+    '''
+    import weldnumpy.weldnumpy as wn
+    wn.set_offload_setitem(False)
+    try:
+        n, w = random_arrays((40, 50), 'float64')
+        n = np.exp(n)
+        w = np.exp(w)
+        n[3, 7] = 1.0
+        w[3, 7] = 1.0
+        n[[5, 1, 5], [2, 3, 2]] = [1.5, 2.5, 3.5]
+        w[[5, 1, 5], [2, 3, 2]] = [1.5, 2.5, 3.5]
+        n[10:12, ::10] = np.arange(10).reshape(2, 5)
+        w[10:12, ::10] = np.arange(10).reshape(2, 5)
+        for value in w.weldobj.context.values():
+            if isinstance(value, np.ndarray) and value.dtype == np.int64:
+                assert value.size < n.size // 8
+        # most elements are set, with a position per element.
+        n[n > 1.5] = 0.5
+        w[w > 1.5] = 0.5
+        assert np.allclose(n, w.evaluate())
+
+        n, w = random_arrays((40, 50), 'float32')
+        n2 = n[2:20, 5:45]
+        w2 = w[2:20, 5:45]
+        n2[1:3, 4] = 7.0
+        w2[1:3, 4] = 7.0
+        n2[-1, [0, -1]] = [8.0, 9.0]
+        w2[-1, [0, -1]] = [8.0, 9.0]
+        assert np.allclose(n, w.evaluate())
+        assert np.allclose(n2, w2.evaluate())
+    finally:
+        wn.set_offload_setitem(True)
+
 def test_nbody_bug2():
     n, w = random_arrays(100, 'float64')
     a = transpose(n[np.newaxis,:])
@@ -1,5 +1,6 @@
 from weld.weldobject import WeldObject
 from weld.encoders import NumpyArrayEncoder, NumpyArrayDecoder
+import weld.ir as ir
 from weldnumpy import *
 import weldnumpy as wn
 import numpy as np
@@ -35,6 +36,10 @@ class weldarray(np.ndarray):
         obj._verbose = verbose
         # Views. For a base_array, this would always be None.
         obj._weldarray_view = None
+        if isinstance(input_array, weldarray):
+            # np.asarray dropped the subclass, so __array_finalize__ took the
+            # shape of the memory, rather than of the registered ops.
+            obj._real_shape = input_array._real_shape
         return obj
 
     def __array_finalize__(self, obj):
@@ -70,6 +75,7 @@ class weldarray(np.ndarray):
             self._num_registered_ops = obj._num_registered_ops
         else:
             self._num_registered_ops = 0
+        self._numpy_thunk = None
 
         if hasattr(obj, '_real_shape'):
             self._real_shape = obj._real_shape
@@ -252,26 +258,23 @@ class weldarray(np.ndarray):
         Cases:
             1. arr[idx] = num
             2. arr[idx] += num
-        idx can be:
+        idx can be anything NumPy supports, e.g.:
             - slice
-            - ndarray
+            - ndarray / list (fancy indexing)
             - int
-        In general, we follow the strategy of offloading everything to NumPy
-        after evaluating the stored operations.
+        If wn.offload_setitem is set, we evaluate the stored operations, and
+        then assign the values with NumPy. Otherwise, the assignment is
+        registered lazily as a single weld pass over the array (see
+        _setitem_lazy).
         '''
-        def _update_single_entry(arr, index, val):
-            '''
-            @start: index to update.
-            @val: new val for index.
-            called from idx = int, or list.
-            '''
-            # update just one element
-            suffix = DTYPE_SUFFIXES[self._weld_type.__str__()]
-            update_str = str(val) + suffix
-            arr._update_range(index, index+1, update_str)
+        if isinstance(val, weldarray):
+            # In the case of a[..] += 5, NumPy calls:
+            #       >>> a.__setitem__(i, a.__getitem__(i).__iadd__(x))
+            # and since the add was done on a weldarray view, it was recorded
+            # in the base array - so the memory of val is out of date, and we
+            # need the evaluated values here.
+            val = val._eval()
 
-        # In general, we just want to offload setitems until we can support in
-        # place ops in NumPy.
         if wn.offload_setitem:
             # We want to evaluate any stored ops first. This is crucial in all
             # situations where we offload stuff to NumPy. Then we can update
@@ -288,87 +291,96 @@ class weldarray(np.ndarray):
                 latest_arr.strides = view_strides
             else:
                 latest_arr = self._eval()
-            # Now, the idx could have been of different kinds
-            if isinstance(idx, slice):
-                # handle index first
-                if idx.step is None: step = 1
-                else: step = idx.step
-                if idx.stop is None: stop = len(self)
-                # this case weirdly happens some times...
-                elif idx.stop > len(self): stop = len(self)
-                else: stop = idx.stop
-                if idx.start is None: start = 0
-                else: start = idx.start
-
-                # surprisingly enough, doing latest_arr_i.__setitem__(idx, val)
-                # fails here for the case when we do a[..] += 5. It appears
-                # that += is implemented as:
-                #       >>> a.__setitem__(i, a.__getitem__(i).__iadd__(x))
-                # and so val already has the correct value -- but since the add
-                # was done on a weldarray, it was recorded in it, and the above
-                # evaluation already causes latest_arr to have the value it
-                # should.
-                # In the second case, with a[..] = 5, things work fine with
-                # setitem as well.
-                # Somehow, switching the setitem call to explicitly looping
-                # over the array and setting each element to val (which has
-                # already been calculated to the correct value in both cases)
-                # seems to work just fine.
-                for val_i, latest_arr_i  in enumerate(range(start, stop, step)):
-                    if hasattr(val, '__len__'):
-                        latest_arr[latest_arr_i] = val[val_i]
-                    else:
-                        # also a single float can be assigned to multiple values
-                        latest_arr[latest_arr_i] = val
-
-            elif isinstance(idx, np.ndarray) or isinstance(idx, list) \
-            or isinstance(idx, tuple):
-                # each element of the idx must be the index into our array
-                for val_i, arr_i in enumerate(idx):
-                    if hasattr(val, '__len__'):
-                        latest_arr[arr_i] = val[val_i]
-                    else:
-                        # must be a float
-                        latest_arr[arr_i] = val
-
-            elif isinstance(idx, int):
-                latest_arr[idx] = val
-            else:
-                assert False, 'idx type {} not supported'.format(type(idx))
+            # a single vectorized assignment for all kinds of indices.
+            latest_arr[idx] = val
+        elif (isinstance(idx, int) and self._weldarray_view is None and
+                len(self._real_shape) == 1 and np.ndim(val) == 0):
+            if idx < 0:
+                idx += self._real_shape[0]
+            # update just one element
+            self._update_range(idx, idx+1,
+                    ir.as_expr(self.weldobj.literal(self.dtype.type(val), self._weld_type)))
         else:
-            # in general, this seems to work, but it is just horribly slow and
-            # MUST be avoided until we can figure out a way to implement
-            # _update_single_entry efficiently in weld using in place ops or
-            # so.
-            if isinstance(idx, slice):
-                if idx.step is None: step = 1
-                else: step = idx.step
-                # FIXME: hacky - need to check exact mechanisms b/w getitem and
-                # setitem calls further.  + it seems like NumPy calls getitem
-                # and evaluates the value, and then sets it to the correct
-                # value here (?) - this seems like a waste.
-                if self._weldarray_view:
-                    for i, e in enumerate(range(idx.start, idx.stop, step)):
-                        # the index should be appropriate for the base array
-                        e += self._weldarray_view.start
-                        _update_single_entry(self._weldarray_view.base_array, e, val[i])
-                else:
-                    # FIXME: In general, this sucks for performance - instead
-                    # add the list as an array to the weldobject context and
-                    # use lookup on it for the weld IR code.  just update it
-                    # for each element in the list
-                    for i, e in enumerate(range(idx.start, idx.stop, step)):
-                        _update_single_entry(self, e, val[i])
-
-            elif isinstance(idx, np.ndarray) or isinstance(idx, list):
-                # just update it for each element in the list
-                for i, e in enumerate(idx):
-                    _update_single_entry(self, e, val[i])
-
-            elif isinstance(idx, int):
-                _update_single_entry(self, idx, val)
-            else:
-                assert False, 'idx type not supported'
+            self._setitem_lazy(idx, val)
+
+    def _setitem_lazy(self, idx, val):
+        '''
+        Registers self[idx] = val as a single pass over the array which stores
+        self's ops (the base array if self is a view).
+
+        The elements being set are found by indexing, with idx, an array of
+        each axis' indices broadcast (without copying) to self's shape, which
+        gives the index of each element being set in the array storing the
+        ops. If few elements are set, the pass looks up the position of an
+        element's new value in val (flattened) in a dictionary from these
+        indices. Otherwise, it zips the array with an int64 array, pos, which
+        has the position of the new value of each element, or -1 if the
+        element is not being set. The indices and positions (and val, if it
+        is not a scalar) are added as inputs of the weldobject.
+        @idx: any index supported by NumPy.
+        @val: scalar, or ndarray / list which can be broadcast to self[idx].
+        '''
+        if self._weldarray_view is not None:
+            view = self._weldarray_view
+            target = view.base_array
+            start = view.start
+            shape = self.shape
+            strides = [s // self.itemsize for s in self.strides]
+        else:
+            target = self
+            start = 0
+            shape = tuple(self._real_shape)
+            strides = [int(np.prod(shape[d+1:])) for d in range(len(shape))]
+        indices = start
+        for d, n in enumerate(shape):
+            axis_indices = np.arange(n, dtype=np.int64).reshape(
+                    (n,) + (1,)*(len(shape) - d - 1))
+            indices = indices + np.broadcast_to(axis_indices, shape)[idx] * strides[d]
+        sel_shape = np.shape(indices)
+        indices = np.ravel(indices)
+        # NumPy sets each element to the last value assigned to it.
+        keys, last = np.unique(indices[::-1], return_index=True)
+        positions = (len(indices) - 1 - last).astype(np.int64)
+
+        if np.ndim(val) == 0:
+            new_val = lambda p: ir.as_expr(target.weldobj.literal(self.dtype.type(val),
+                    self._weld_type))
+        else:
+            # copy, since NumPy reads the values at the time of assignment.
+            vals = np.array(np.broadcast_to(val, sel_shape), dtype=self.dtype).ravel()
+            vals_name = target.weldobj.update(vals)
+            new_val = lambda p: ir.Lookup(ir.Raw(vals_name), p)
+
+        # the thunk does not compute the update.
+        target._numpy_thunk = None
+        size = int(np.prod(target._real_shape))
+        b, i, e = ir.Param("b"), ir.Param("i"), ir.Param("e")
+        if len(keys) * SETITEM_DICT_RATIO < size:
+            keys_name = target.weldobj.update(keys.astype(np.int64))
+            positions_name = target.weldobj.update(positions)
+            # the dictionary is built once, before the pass over the array.
+            pos = ir.Raw("setitem_pos")
+            update = ir.If(ir.Call("keyexists", [pos, i]),
+                           new_val(ir.Lookup(pos, i)), e)
+            target.weldobj.weld_code = ir.Let(pos.code,
+                ir.Result(ir.For(ir.Zip([ir.Raw(keys_name), ir.Raw(positions_name)]),
+                    ir.DictMerger(WeldLong(), WeldLong(), '+'),
+                    ir.Lambda([b, i, e], ir.Merge(b, e)))),
+                ir.Result(ir.For(ir.as_expr(target.weldobj.weld_code), ir.Appender(),
+                    ir.Lambda([b, i, e], ir.Merge(b, update)))))
+            return
+
+        pos = np.full(size, -1, dtype=np.int64)
+        pos[keys] = positions
+        pos_name = target.weldobj.update(pos)
+
+        def update(e):
+            p = ir.GetField(e, 1)
+            return ir.If(ir.BinOp('>=', p, ir.Literal(0, WeldLong())),
+                         new_val(p), ir.GetField(e, 0))
+
+        target.weldobj.weld_code = ir.map_vec(ir.Zip([
+            ir.as_expr(target.weldobj.weld_code), ir.Raw(pos_name)]), update)
 
     def _gen_weldobj(self, arr):
         '''
@@ -380,8 +392,12 @@ class weldarray(np.ndarray):
         Sets self.name and self.weldobj.
         '''
         self.weldobj = WeldObject(NumpyArrayEncoder(), NumpyArrayDecoder())
+        # the new weldobj has no registered ops for the thunk to compute.
+        self._numpy_thunk = None
         if isinstance(arr, weldarray):
             self.weldobj.update(arr.weldobj)
+            # the code refers to the objects arr's ops depend on.
+            self.weldobj.dependencies.update(arr.weldobj.dependencies)
             self.weldobj.weld_code = arr.weldobj.weld_code
             self.name = arr.name
         else:
@@ -391,6 +407,22 @@ class weldarray(np.ndarray):
             self.name = self.weldobj.weld_code = self.weldobj.update(arr,
                     SUPPORTED_DTYPES[str(arr.dtype)])
 
+    def _adopt_ndarray(self, arr):
+        '''
+        Wraps a plain (contiguous) ndarray, which is an input of an op on self,
+        as a weldarray. The weldarray shares arr's memory, so arr is added to
+        the context of the weldobject without being copied, and the op stays
+        lazy. The same ndarray is always bound to the same name, so using it
+        in several ops does not add it to the program more than once.
+
+        Like NumPy's own views, the adopted array reads arr's memory: arr is
+        only read when the result is evaluated, so it should not be modified
+        in place before that.
+        @arr: ndarray.
+        @ret: weldarray.
+        '''
+        return weldarray(arr, verbose=self._verbose)
+
     def _process_ufunc_inputs(self, input_args, outputs, kwargs):
         '''
         Helper function for __array_ufunc__ that deals with the input/output
@@ -412,20 +444,23 @@ class weldarray(np.ndarray):
         scalars = []
         shapes = []
         for i in input_args:
-            # FIXME: This enforces that if ndarray op weldarray, then we force
-            # evaluation with weldarray. Usually, this does not seem required,
-            # but somehow, in cases with non-contiguous arrays, it seems to
-            # fail otherwise. Might just be a bug in weldnumpy, will need to
-            # explore further.
+            # plain ndarrays are adopted as inputs of the weldobject without
+            # copying them (see _adopt_ndarray), which passes a pointer to
+            # their memory to weld, so they must be contiguous.
             if isinstance(i, np.ndarray) and not isinstance(i, weldarray):
-                return False
+                if i.ndim == 0:
+                    if self._verbose: print('WARNING: 0-d ndarray input. Will be offloaded to NumPy')
+                    return False
+                if not i.flags.c_contiguous:
+                    if self._verbose: print('WARNING: non-contiguous ndarray input. Will be offloaded to NumPy')
+                    return False
 
             if isinstance(i, np.ndarray):
                 if not str(i.dtype) in SUPPORTED_DTYPES:
                     if self._verbose: print('WARNING {} not in supported dtypes. Will be offloaded to \
                             NumPy'.format(str(i.dtype)))
                     return False
-                if len(i) == 0:
+                if i.size == 0:
                     if self._verbose: print('WARNING: length 0 array. Will be offloaded to NumPy')
                     return False
                 if isinstance(i, weldarray):
@@ -443,18 +478,23 @@ class weldarray(np.ndarray):
             else:
                 scalars.append(i)
 
-        if len(arrays) == 2 and arrays[0].dtype != arrays[1].dtype:
-            if self._verbose: print('WARNING: array dtypes do not match. Will be offloaded to NumPy')
-            return False
-        elif len(arrays) == 2 and shapes[0] != shapes[1]:
-            if self._verbose: print('WARNING: array shapes dont match. Will probably need to be broadcast')
-            return False
-
-        # handle all scalar based tests here - later will just assume that
-        # scalar type is correct, and use the suffix based on the weldarray's
-        # type.
-        # TODO: add more scalar tests for python int/float: floats -> f32, f64,
-        # or ints -> i32, i64 need to match).
+        # arrays (or scalars) of different dtypes are cast to the dtype NumPy
+        # promotes them to in the weld code (see _handle_call).
+        if len(arrays) == 2 and tuple(shapes[0]) != tuple(shapes[1]):
+            # broadcasting: the arrays being broadcast are iterated with
+            # nditer, so they must be contiguous.
+            shape = broadcast_shape(shapes[0], shapes[1])
+            if shape is None:
+                if self._verbose: print('WARNING: array shapes can not be broadcast. Will be offloaded to NumPy')
+                return False
+            for arr, arr_shape in zip(arrays, shapes):
+                if tuple(arr_shape) != shape and not arr.flags.contiguous:
+                    if self._verbose: print('WARNING: broadcasting non-contiguous array. Will be offloaded to NumPy')
+                    return False
+            if (outputs and isinstance(outputs[0], weldarray) and
+                    tuple(outputs[0]._real_shape) != shape):
+                # NumPy raises an error in this case.
+                return False
         elif len(arrays) == 1 and len(scalars) == 1:
             # need to test for bool before int because it True would be
             # instance of int as well.
@@ -462,35 +502,12 @@ class weldarray(np.ndarray):
                 if self._verbose:
                     print('WARNING: scalar input is boolean. Will be offloaded to NumPy')
                 return False
-            elif isinstance(scalars[0], float):
-                if not (arrays[0].dtype == np.float64 or
-                        arrays[0].dtype == np.float32):
-                    return False
-            elif isinstance(scalars[0], int):
-                if not (arrays[0].dtype == np.int64 or
-                        arrays[0].dtype == np.int32):
-                    return False
-            # assuming its np.float32 etc.
-            elif not str(scalars[0].dtype) in SUPPORTED_DTYPES:
-                if self._verbose:
-                    print('WARNING: scalar dtype not in supported dtypes. Will be offloaded to NumPy')
-                return False
-            else:
-                scalar_weld_type = SUPPORTED_DTYPES[str(scalars[0].dtype)]
-                array_weld_type = arrays[0]._weld_type
-                if scalar_weld_type != array_weld_type:
-                    if self._verbose:
-                        print('WARNING: scalar weld type {} != array weld type {}'.format
-                                (scalar_weld_type, array_weld_type))
-                    return False
 
         # check ouput.
         if outputs:
             # if the output is not weldarray, then let NumPy deal with it.
             if not (len(outputs) == 1 and isinstance(outputs[0], weldarray)):
                 return False
-            if len(arrays) == 2 and arrays[0].shape != arrays[1].shape:
-                return False
 
         return True
 
@@ -510,6 +527,10 @@ class weldarray(np.ndarray):
         outputs = kwargs.pop('out', None)
         supported = self._process_ufunc_inputs(input_args, outputs, kwargs)
         output = None
+        # the inputs' thunks must be taken before an inplace op updates them.
+        thunk_args = None
+        if wn.tiered and supported and method in ('__call__', 'reduce'):
+            thunk_args = self._get_thunk_args(input_args)
         if self._num_registered_ops > MAX_REGISTERED_OPS:
             # force evaluation internally.
             self._eval()
@@ -517,15 +538,47 @@ class weldarray(np.ndarray):
         if supported and method == '__call__':
             output = self._handle_call(ufunc, input_args, outputs, kwargs)
         elif supported and method == 'reduce':
-            output = self._handle_reduce(ufunc, input_args, outputs, kwargs)
+            output = self._handle_reduce(ufunc, input_args, outputs, kwargs,
+                    thunk_args)
 
         if output is not None:
             if self._verbose: print('ufunc was supported ', ufunc)
+            if not isinstance(output, weldarray):
+                # the scalar result of a reduction.
+                return output
             output._num_registered_ops += 1
+            if thunk_args is not None:
+                func = ufunc if method == '__call__' else getattr(ufunc, method)
+                output._numpy_thunk = numpy_thunk(func, thunk_args, kwargs,
+                        output.dtype)
+            else:
+                output._numpy_thunk = None
             return output
 
         return self._handle_NumPy(ufunc, method, input_args, outputs, kwargs)
 
+    def _get_thunk_args(self, input_args):
+        '''
+        @input_args: ufunc inputs.
+        @ret: list of the values, or thunks computing the values, of the
+        inputs, or None if one of them can't be computed with NumPy.
+        '''
+        thunk_args = []
+        for arg in input_args:
+            if isinstance(arg, weldarray):
+                if arg._weldarray_view:
+                    # ops on views are stored in their base array.
+                    return None
+                if arg.name == arg.weldobj.weld_code:
+                    # no registered ops.
+                    arg = arg.weldobj.context[arg.name]
+                elif arg._numpy_thunk is None:
+                    return None
+                else:
+                    arg = arg._numpy_thunk
+            thunk_args.append(arg)
+        return thunk_args
+
     def _handle_NumPy(self, ufunc, method, input_args, outputs, kwargs):
         '''
         Offload executing ufunc to NumPy, typically because there was some
@@ -615,6 +668,14 @@ class weldarray(np.ndarray):
         elif ufunc.__name__ in wn.BINARY_OPS:
             # weldarray can be first or second arg.
             if self._verbose: print('supported op: ', ufunc.__name__)
+            # inputs of different types are cast to the type of the result.
+            dtype = result_dtype(ufunc, input_args)
+            if dtype is None or str(dtype) not in SUPPORTED_DTYPES:
+                return None
+            if output is not None and output.dtype != dtype:
+                # TODO: support inplace ops which cast the result down.
+                if self._verbose: print('WARNING: inplace op changes the dtype. Will be offloaded to NumPy')
+                return None
             if ufunc.__name__ == 'square' and len(input_args) == 1:
                 # power arg is implied
                 if str(self.dtype) == "float32":
@@ -623,7 +684,7 @@ class weldarray(np.ndarray):
                     input_args.append(np.float64(2.00))
 
             return self._binary_op(input_args[0], input_args[1],
-                    wn.BINARY_OPS[ufunc.__name__], result=output)
+                    wn.BINARY_OPS[ufunc.__name__], result=output, dtype=dtype)
 
         # FIXME: Not doing this because NumPy returns Boolean array -- and if we do that, then we can't
         # multiply it with f64 arrays in weld because of type mismatch.
@@ -641,46 +702,56 @@ class weldarray(np.ndarray):
         if result is None:
             result = self._get_result()
         op = wn.CMP_OPS[op]
-        template = ('result(for({arr}, appender,|b,i,e| if (e {op} {input2}{suffix},'
-                'merge(b,1.0{suffix}),merge(b,0.0{suffix}))))')
+        weld_type = self._weld_type
+        b, i, e = ir.Param("b"), ir.Param("i"), ir.Param("e")
+        update = ir.If(ir.BinOp(op, e, ir.Literal(input2, weld_type)),
+                       ir.Merge(b, ir.Literal(1.0, weld_type)),
+                       ir.Merge(b, ir.Literal(0.0, weld_type)))
 
         arr = self._get_array_iter_code(result)
-        code = template.format(arr = arr,
-                               op = op,
-                               input2 = input2,
-                               suffix = DTYPE_SUFFIXES[self._weld_type])
-        result.weldobj.weld_code = code
+        result.weldobj.weld_code = ir.Result(ir.For(arr, ir.Appender(),
+                                                    ir.Lambda([b, i, e], update)))
         return result
 
-    def _handle_reduce(self, ufunc, input_args, outputs, kwargs):
+    def _handle_reduce(self, ufunc, input_args, outputs, kwargs,
+            thunk_args=None):
         '''
-        Supports reductions for 1d arrays.
-        TODO: For multi-dimensional case, might need extra work here if the
-        reduction is being performed only along a certain axis.
-
-        We force evaluation at the end of the reduction - weird errors if we
-        don't. This seems safer anyway.
-        NumPy supports reduce only for binary ops.
-
-        @ret: array updated with weld code, or None.
+        Supports reductions over any axis, or over all axes, of N-d arrays.
+        The reduction is fused with the ops registered on self, i.e., it is
+        computed by a merger in the loop producing the values.
+        NumPy supports reduce only for binary ops, and Weld's mergers only for
+        commutative ones.
+        @thunk_args: the inputs of the NumPy thunk computing the reduction
+        with tiered execution, or None.
+
+        @ret: the scalar result of a reduction over all axes, the result array
+        (updated with weld code) of a reduction over one axis, or None.
         '''
-        if self._verbose:
-            print('WARNING: not handling reduce because NumPy seems to be faster')
-        return None
-
         # input_args[0] must be self so it can be ignored.
         if len(input_args) > 1:
             return None
+        if ufunc.__name__ not in wn.REDUCE_OPS:
+            return None
+        # dtype / keepdims / initial etc. are left to NumPy.
+        for key, value in kwargs.items():
+            if key != 'axis' and value not in (None, False):
+                return None
 
         if self._verbose: print('in handle reduce')
         if outputs: output = outputs[0]
         else: output = None
-        axis = kwargs['axis']
-
-        if ufunc.__name__ in wn.BINARY_OPS:
-            return self._reduce_op(wn.BINARY_OPS[ufunc.__name__], axis=axis,
-                    result=output)
-        return None
+        # NumPy's default for ufunc.reduce is axis=0.
+        axis = kwargs.get('axis', 0)
+        # NumPy accumulates small integers in a wider type, e.g. int32 sums
+        # are int64.
+        dtype = ufunc.reduce(np.ones(1, dtype=self.dtype)).dtype
+        if str(dtype) not in SUPPORTED_DTYPES:
+            return None
+        thunk = None
+        if thunk_args is not None:
+            thunk = numpy_thunk(ufunc.reduce, thunk_args, kwargs, dtype)
+        return self._reduce_op(wn.REDUCE_OPS[ufunc.__name__], axis=axis,
+                result=output, dtype=dtype, thunk=thunk)
 
     def evaluate(self):
         '''
@@ -747,10 +818,19 @@ class weldarray(np.ndarray):
             ret = self.weldobj.context[self.name]
             return self.weldobj.context[self.name]
 
+        arr = None
         if restype is None:
             # use default type for all weldarray operations
             restype = WeldVec(self._weld_type)
-        arr = self.weldobj.evaluate(restype, verbose=self._verbose, passes=CUR_PASSES)
+            # Tiered execution: if the Weld program is not compiled yet, use
+            # NumPy this time, while it is compiled in the background.
+            if self._numpy_thunk is not None and not weld_module_ready(
+                    self.weldobj, CUR_PASSES):
+                if self._verbose: print('evaluating with NumPy while Weld compiles')
+                arr = self._numpy_thunk.compute()
+        if arr is None:
+            arr = self.weldobj.evaluate(restype, verbose=self._verbose,
+                    passes=CUR_PASSES, num_threads=wn.num_threads)
 
         if hasattr(arr, '__len__'):
             arr = arr.reshape(self._real_shape)
@@ -774,14 +854,28 @@ class weldarray(np.ndarray):
         self._gen_weldobj(arr)
         return arr
 
-    def _get_result(self):
+    def _get_result(self, dtype=None, shape=None):
         '''
         Creating a new result weldarray from self. If self is view into a
         weldarray, then evaluate the parent first as self would not be storing
         the ops that have been registered to it (only base_array would store
         those).
+        @dtype: dtype of the result, if it is not self's dtype.
+        @shape: shape of the result, if it is not self's shape, e.g. for
+        broadcasts and reductions.
+        If either differs from self's, the result is a new (uninitialized)
+        array, so that its shape and dtype are right before it is evaluated.
+        Its values are computed by the registered ops, so the parent of a view
+        does not need to be evaluated.
         '''
-        if self._weldarray_view:
+        if dtype is None:
+            dtype = self.dtype
+        if shape is None:
+            shape = self._real_shape
+        if dtype != self.dtype or tuple(shape) != self.shape:
+            result = weldarray(np.empty(shape, dtype=dtype),
+                    verbose=self._verbose)
+        elif self._weldarray_view:
             idx = self._weldarray_view.idx
             if idx is not None:
                 result = weldarray(self._weldarray_view.parent._eval()[idx],
@@ -824,7 +918,6 @@ class weldarray(np.ndarray):
         # Checking if it is inplace is very important -- normally we would add the obj_id
         inplace = self.weldobj.obj_id == res.weldobj.obj_id
         if self._weldarray_view and not self.flags.contiguous:
-            nditer_arr = 'nditer({arr},{start}L,{end}L,1L,{shape},{strides})'
             shape = np.array(self._weldarray_view.shape)
             strides = np.array(self._weldarray_view.strides)
             for i, s in enumerate(strides):
@@ -834,11 +927,12 @@ class weldarray(np.ndarray):
             strides = res.weldobj.update(strides)
             # Note: the start/end/shapes/strides symbols for nditer are valid
             # if we start from the base array.
-            arr = nditer_arr.format(arr = self._weldarray_view.base_array.weldobj.weld_code,
-                                    start = self._weldarray_view.start,
-                                    end = self._weldarray_view.end,
-                                    shape = shape,
-                                    strides = strides)
+            arr = ir.NdIter(ir.as_expr(self._weldarray_view.base_array.weldobj.weld_code),
+                            ir.Literal(self._weldarray_view.start, WeldLong()),
+                            ir.Literal(self._weldarray_view.end, WeldLong()),
+                            ir.Literal(1, WeldLong()),
+                            ir.Raw(shape),
+                            ir.Raw(strides))
             res.weldobj.update(self._weldarray_view.base_array.weldobj)
             # TODO: Have a separate case for contiguous views. Check this
             # further -- maybe we can change self._get_result too?
@@ -855,74 +949,162 @@ class weldarray(np.ndarray):
                 # FIXME: NEED TO TEST THIS better. This should not work because
                 # views DO NOT HAVE any operations stored in them.
                 # arr = res.weldobj.obj_id
-                arr = self.weldobj.obj_id
+                arr = ir.Raw(self.weldobj.obj_id)
                 res.weldobj.update(self.weldobj)
                 res.weldobj.dependencies[self.weldobj.obj_id] = self.weldobj
         else:
             # Add id, and update dependencies for the returned array.
             assert isinstance(self, weldarray)
             if inplace:
-                arr = self.weldobj.weld_code
+                # Sharing the expression (rather than copying its text) keeps
+                # the code of chained inplace ops, e.g. a += a, linear.
+                arr = ir.as_expr(self.weldobj.weld_code)
             else:
-                arr = self.weldobj.obj_id
+                arr = ir.Raw(self.weldobj.obj_id)
                 res.weldobj.update(self.weldobj)
                 res.weldobj.dependencies[self.weldobj.obj_id] = self.weldobj
         return arr
 
-    def _reduce_op(self, op, axis=None, result=None):
+    def _cast_code(self, e, weld_type):
+        '''
+        @e: ir.Expr, an element of self.
+        @weld_type: weld type that the element is used as.
+        @ret: ir.Expr, e cast to weld_type if self has a different type.
+        '''
+        if self._weld_type == weld_type:
+            return e
+        return ir.Cast(weld_type, e)
+
+    def _get_broadcast_iter_code(self, res, shape):
+        '''
+        Like _get_array_iter_code, but iterates over the values of self
+        broadcast to shape, without materializing them: self is iterated with
+        nditer, using 0 strides along the dimensions being broadcast.
+        @res: weldarray, the result of the op.
+        @shape: tuple, shape that self's real shape broadcasts to.
+        '''
+        arr = self._get_array_iter_code(res)
+        real_shape = tuple(self._real_shape)
+        if real_shape == shape:
+            return arr
+        assert not isinstance(arr, ir.NdIter), 'broadcast array must be contiguous'
+        real_shape = (1,)*(len(shape) - len(real_shape)) + real_shape
+        strides = []
+        for d in range(len(shape)):
+            if real_shape[d] == 1 and shape[d] != 1:
+                strides.append(0)
+            else:
+                strides.append(int(np.prod(real_shape[d+1:])))
+        shape_name = res.weldobj.update(np.array(shape, dtype='int64'))
+        strides_name = res.weldobj.update(np.array(strides, dtype='int64'))
+        i64 = lambda v: ir.Literal(v, WeldLong())
+        return ir.NdIter(arr, i64(0), i64(int(np.prod(shape))), i64(1),
+                ir.Raw(shape_name), ir.Raw(strides_name))
+
+    def _reduce_op(self, op, axis=None, result=None, dtype=None, thunk=None):
         '''
         helper method for reductions.
-        @op: binary op to apply to self.
-        @axis: Only axis == 0 is supported right now.
+        @op: commutative binary op to apply to self, + or *.
+        @axis: None, int or tuple of ints, as in NumPy.
+        @dtype: dtype the values are accumulated in, and of the result. By
+        default, self's dtype.
+        @thunk: numpy_thunk computing a reduction over all axes, which is used
+        instead of Weld while the program compiles (tiered execution).
+        @ret: scalar for reductions over all axes, weldarray for reductions
+        over one axis, or None if the reduction should be done by NumPy.
         '''
         if result is not None:
             return None
+        shape = self._real_shape
+        ndim = len(shape)
         if axis is None:
-            template = 'result(for({arr},merger[{type}, {op}], |b, i, e| merge(b, e)))'
-            self.weldobj.weld_code = template.format(arr =
-                    self.weldobj.weld_code, type = self._weld_type.__str__(),
-                    op  = op)
-            return self._eval(restype = self._weld_type)
-
-        # reducing along an axis.
-        # FIXME: Right now, only supporting the simplest of cases - 2d arrays,
-        # with axis=0.  Loop over an outer appender, = dimensions of output -->
-        # and then merge each row in the inner for loop.
-        if axis != 0:
+            axes = range(ndim)
+        else:
+            if not isinstance(axis, tuple):
+                axis = (axis,)
+            axes = [a + ndim if a < 0 else a for a in axis]
+            if len(set(axes)) != len(axes) or not all(0 <= a < ndim for a in axes):
+                # let NumPy raise the error.
+                return None
+
+        if len(axes) > 1 and len(axes) < ndim:
+            return None
+        # vecmergers only support +, so for other ops the values are read
+        # with strided iters, which can't be nested in an nditer.
+        if (op != '+' and len(axes) < ndim and self._weldarray_view and
+                not self.flags.contiguous):
             return None
 
-        other_axis = (axis + 1) % 2
-        template = ('result(for({dim_arr}, appender, |b,i,e| merge(b, result(for(iter({arr},'
-                    '{start},{end}L,{stride}L), merger[{type}, {op}], |b2, i2, e2| merge(b2,'
-                    'e2))))))')
-        rows = self.shape[axis]
-        columns = self.shape[other_axis]
-        outer_stride = self.strides[axis] / self.itemsize
-        inner_stride = self.strides[other_axis] / self.itemsize
-
-        start = 'i*{}L'.format(inner_stride)
-        stride = str(outer_stride)
-        # FIXME: Technically, I think this should work as well but is it a bug
-        # in weld? It seems like iter(e0, 0, 3, 4) would fail because end
-        # should be exactly 4 or above.  end = str(outer_stride*self.shape[0]+1)
-        end = 'i*{}L + {}L*{}'.format(inner_stride, outer_stride, rows)
-        dim_arr = np.array(range(self.shape[other_axis]))
-        # declare an output array
-        # TODO: is this best way?
-        result = self._get_result()
-        result._real_shape = (self.shape[other_axis],)
+        if dtype is None:
+            dtype = self.dtype
+        weld_type = SUPPORTED_DTYPES[str(dtype)]
+        b, i, e = ir.Param("b"), ir.Param("i"), ir.Param("e")
 
+        if len(axes) == ndim:
+            # reducing all the values to a scalar: the result array is only
+            # used for its weldobject, so it shares self's memory.
+            result = self._get_result()
+            arr = self._get_array_iter_code(result)
+            result.weldobj.weld_code = ir.Result(ir.For(arr,
+                ir.Merger(weld_type, op),
+                ir.Lambda([b, i, e], ir.Merge(b, self._cast_code(e, weld_type)))))
+            if thunk is not None and not weld_module_ready(result.weldobj,
+                    CUR_PASSES):
+                if self._verbose: print('reducing with NumPy while Weld compiles')
+                return thunk.compute()[()]
+            return result.weldobj.evaluate(weld_type, verbose=self._verbose,
+                    passes=CUR_PASSES, num_threads=wn.num_threads)
+
+        # reducing along a single axis: view self as an (outer, rows, inner)
+        # array and reduce the rows.
+        axis = axes[0]
+        outer = int(np.prod(shape[:axis]))
+        rows = shape[axis]
+        inner = int(np.prod(shape[axis+1:]))
+        result = self._get_result(dtype,
+                tuple(shape[:axis]) + tuple(shape[axis+1:]))
+        # the values of self, in row-major order.
         arr = self._get_array_iter_code(result)
+        i64 = lambda v: ir.Literal(v, WeldLong())
+
+        if op == '+':
+            # A single pass over the values, which fuses with the loop
+            # producing them: the value with index i is merged into output
+            # (i / (rows*inner)) * inner + i % inner.
+            if inner == 1:
+                index = ir.BinOp('/', i, i64(rows))
+            elif outer == 1:
+                index = ir.BinOp('%', i, i64(inner))
+            else:
+                index = ir.BinOp('+',
+                        ir.BinOp('*', ir.BinOp('/', i, i64(rows * inner)), i64(inner)),
+                        ir.BinOp('%', i, i64(inner)))
+            init = np.zeros(outer * inner, dtype=dtype)
+            init_name = result.weldobj.update(init, SUPPORTED_DTYPES[str(init.dtype)])
+            result.weldobj.weld_code = ir.Result(ir.For(arr,
+                ir.VecMerger(weld_type, op, ir.Raw(init_name)),
+                ir.Lambda([b, i, e], ir.Merge(b, ir.MakeStruct([index,
+                    self._cast_code(e, weld_type)])))))
+            return result
+
+        # vecmergers only support +, so for other ops each output value is
+        # reduced from a strided iter over the materialized values.
+        b2, i2, e2 = ir.Param("b2"), ir.Param("i2"), ir.Param("e2")
+        # e is the index of the output value: (e / inner, e % inner).
+        start = ir.BinOp('+',
+                ir.BinOp('*', ir.BinOp('/', e, i64(inner)), i64(rows * inner)),
+                ir.BinOp('%', e, i64(inner)))
+        end = ir.BinOp('+', start, i64(rows * inner))
+        dim_arr = np.arange(outer * inner, dtype='int64')
         dim_arr_name = result.weldobj.update(dim_arr,
                 SUPPORTED_DTYPES[str(dim_arr.dtype)])
-        code = template.format(dim_arr = dim_arr_name,
-                               arr = arr,
-                               start = start,
-                               end = end,
-                               stride = stride,
-                               type = self._weld_type.__str__(),
-                               op = op)
-        result.weldobj.weld_code = code
+        row = ir.Result(ir.For(ir.Iter(arr, start, end, i64(inner)),
+                               ir.Merger(weld_type, op),
+                               ir.Lambda([b2, i2, e2],
+                                   ir.Merge(b2, self._cast_code(e2, weld_type)))))
+        result.weldobj.weld_code = ir.Result(ir.For(
+            ir.Raw(dim_arr_name), ir.Appender(),
+            ir.Lambda([b, i, e], ir.Merge(b, row))))
         return result
 
     def _unary_op(self, unop, result=None):
@@ -937,10 +1119,8 @@ class weldarray(np.ndarray):
             @res: weldarray to be updated.
             @unop: str, operator applied to res.
             '''
-            template = 'result(for({arr}, appender,|b,i,e| merge(b,{unop}(e))))'
             arr = self._get_array_iter_code(res)
-            code = template.format(arr = arr, unop = unop)
-            res.weldobj.weld_code = code
+            res.weldobj.weld_code = ir.map_vec(arr, lambda e: ir.Call(unop, [e]))
 
         if result is None:
             result = self._get_result()
@@ -952,8 +1132,8 @@ class weldarray(np.ndarray):
             # in place op + view, just update base array and return.
             if result._weldarray_view:
                 v = result._weldarray_view
-                update_str = '{unop}(e)'.format(unop=unop)
-                v.base_array._update_range(v.start, v.end, update_str)
+                update = ir.Call(unop, [ir.Param("e")])
+                v.base_array._update_range(v.start, v.end, update)
                 return result
 
         # Since it is a unary op - result is derived from self, so this is not
@@ -963,23 +1143,25 @@ class weldarray(np.ndarray):
         _update_array_unary_op(result, unop)
         return result
 
-    def _update_range(self, start, end, update_str, strides=1):
+    def _update_range(self, start, end, update, strides=1):
         '''
         @start, end: define which values of the view needs to be updated - for
         a child, it would be all values, and for parent it wouldn't be.
-        @update_str: code to be executed in the if block to update the
-        variable, 'e', in the given range.
+        @update: ir expression computing the new value of the element, 'e',
+        with index 'i', in the given range.
         '''
-        views_template = "result(for({arr1}, appender,|b,i,e| if \
-        (i >= {start}L & i < {end}L,merge(b,{update_str}),merge(b,e))))"
-
+        # the thunk does not compute the update.
+        self._numpy_thunk = None
+        b, i, e = ir.Param("b"), ir.Param("i"), ir.Param("e")
+        in_range = ir.BinOp('&', ir.BinOp('>=', i, ir.Literal(start, WeldLong())),
+                            ir.BinOp('<', i, ir.Literal(end, WeldLong())))
         # all values of child will be updated. so start = 0, end = len(c)
-        self.weldobj.weld_code = views_template.format(arr1 = self.weldobj.weld_code,
-                                                      start = start,
-                                                      end   = end,
-                                                      update_str = update_str)
+        self.weldobj.weld_code = ir.Result(ir.For(
+            ir.as_expr(self.weldobj.weld_code), ir.Appender(),
+            ir.Lambda([b, i, e], ir.If(in_range, ir.Merge(b, update),
+                                       ir.Merge(b, e)))))
 
-    def _binary_op(self, input1, input2, binop, result=None):
+    def _binary_op(self, input1, input2, binop, result=None, dtype=None):
         '''
         @input1: weldarray, or a scalar.
         @input2: weldarray, or a scalar.
@@ -988,6 +1170,9 @@ class weldarray(np.ndarray):
         weldnumpy.py.
         @result: output array. If it has been specified by the caller, then
         don't allocate new array. This MUST be input1, or input2.
+        @dtype: dtype of the result, as promoted by NumPy (see
+        weldnumpy.result_dtype). Inputs of other types are cast to it in the
+        weld code. If result is specified, it must have this dtype.
 
         @ret: array updated with the relevant weld code, or None.
 
@@ -1007,18 +1192,14 @@ class weldarray(np.ndarray):
             - Scalar inputs: Either input1, or input2 could be a scalar.
             - The shapes for the two inputs might not match - as long as it is
               allowed by NumPy's broadcasting rules, then it should work as
-              expected. See nested function _broadcast_arrays for more details.
+              expected. See _get_broadcast_iter_code for more details.
         '''
         def _update_input(inp):
             '''
-            1. evaluate the parent if it is a view.
-            2. convert to weldarray if it is a NumPy ndarray.
+            convert to weldarray if it is a NumPy ndarray.
             '''
             if isinstance(inp, np.ndarray) and not isinstance(inp, weldarray):
-                # TODO: could optimize this by skipping conversion to weldarray.
-                # turn it into weldarray - for convenience, as this reduces to the
-                # case of other being a weldarray.
-                inp = weldarray(inp)
+                inp = self._adopt_ndarray(inp)
             return inp
 
         def _scalar_binary_op(input1, input2, binop, result):
@@ -1028,27 +1209,24 @@ class weldarray(np.ndarray):
             @result: weldarray to store results in.
             '''
             # which of these is the scalar?
-            template = 'result(for({arr}, appender,|b,i,e| merge(b,{update_str})))'
             if not hasattr(input2, "__len__"):
                 arr = input1._get_array_iter_code(result)
-                scalar = input2
+                scalar = ir.as_expr(result.weldobj.literal(input2, result._weld_type))
                 real_shape = input1._real_shape
+                cast = input1._cast_code
                 if binop == "pow":
                     # in case of power, vector has to be the first input
-                    update_str = "{binop}(e, {scalar}{suffix})"
+                    update = lambda e: ir.Call(binop, [cast(e, result._weld_type), scalar])
                 else:
-                    update_str = "e {binop} {scalar}{suffix}"
+                    update = lambda e: ir.BinOp(binop, cast(e, result._weld_type), scalar)
             else:
-                update_str = "{scalar}{suffix} {binop} e"
                 arr = input2._get_array_iter_code(result)
-                scalar = input1
+                scalar = ir.as_expr(result.weldobj.literal(input1, result._weld_type))
                 real_shape = input2._real_shape
+                cast = input2._cast_code
+                update = lambda e: ir.BinOp(binop, scalar, cast(e, result._weld_type))
 
-            weld_type = result._weld_type.__str__()
-            update_str = update_str.format(binop = binop,
-                                           scalar = str(scalar),
-                                           suffix = DTYPE_SUFFIXES[weld_type])
-            result.weldobj.weld_code = template.format(arr = arr, update_str=update_str)
+            result.weldobj.weld_code = ir.map_vec(arr, update)
             result._real_shape = real_shape
             return result
 
@@ -1065,39 +1243,18 @@ class weldarray(np.ndarray):
             # we should not update result as that would evaluate the parent array - since we are
             # only adding more inplace ops, that should not be needed.
             other = _update_input(other)
-            update_str_template = '{e2}{binop}e'
             v = result._weldarray_view
             if isinstance(other, weldarray):
-                lookup_ind = 'i-{st}'.format(st=v.start)
+                lookup_ind = ir.BinOp('-', ir.Param("i"), ir.Literal(v.start, WeldLong()))
                 # update the base array to include the context from other
                 v.base_array.weldobj.update(other.weldobj)
-                e2 = 'lookup({arr2},{i}L)'.format(arr2 = other.weldobj.weld_code, i = lookup_ind)
+                e2 = other._cast_code(ir.Lookup(ir.as_expr(other.weldobj.weld_code),
+                                                lookup_ind), result._weld_type)
             else:
                 # other is just a scalar.
-                e2 = str(other) + DTYPE_SUFFIXES[result._weld_type.__str__()]
-            update_str = update_str_template.format(e2 = e2, binop=binop)
-            v.base_array._update_range(v.start, v.end, update_str)
-
-        def _broadcast_arrays(arr1, arr2):
-            '''
-            If arr1.shape != arr2.shape, then this tries to use np.broadcast to still do the
-            computation.
-            '''
-            def finalize_array(arr, orig_arr):
-                '''
-                Creates a weldview only if orig_arr is actually different from arr.
-                We seeem to need this for some slightly mysterious reason.
-                TODO: might need to check edge cases for nditer.
-                Solves the issue with test_broadcasting_bug.
-                '''
-                if arr.shape != orig_arr.shape:
-                    return orig_arr._gen_weldview(arr)
-                else:
-                    return orig_arr
-            arr1_b, arr2_b = np._broadcast_arrays(arr1, arr2)
-            arr1_b = finalize_array(arr1_b, arr1)
-            arr2_b = finalize_array(arr2_b, arr2)
-            return arr1_b, arr2_b
+                e2 = ir.as_expr(v.base_array.weldobj.literal(other, result._weld_type))
+            update = ir.BinOp(binop, e2, ir.Param("e"))
+            v.base_array._update_range(v.start, v.end, update)
 
         # Scenario 1: Inplace Op
         # if result is not None and result._weldarray_view:
@@ -1131,10 +1288,22 @@ class weldarray(np.ndarray):
                 new_weldobj.weld_code = result.weldobj.weld_code
                 result.weldobj = new_weldobj
 
+        # Scenario 2: Non Inplace Op + Inplace Op on a non-view.
+        input1 = _update_input(input1)
+        input2 = _update_input(input2)
+        # we need to compare real shapes because the operations are lazily
+        # evaluated so shapes could be changing...
+        if not hasattr(input1, "__len__"):
+            shape = input2._real_shape
+        elif not hasattr(input2, "__len__"):
+            shape = input1._real_shape
+        else:
+            shape = broadcast_shape(input1._real_shape, input2._real_shape)
+            assert shape is not None, 'shapes must be broadcastable'
+
         # Scenario 2b: Non-Inplace ops.
         if result is None:
-            result = self._get_result()
-
+            result = self._get_result(dtype, shape)
 
         # if it is not None, then result must be a weldarray already - and
         # since we are updating it in place, then we should not call
@@ -1142,35 +1311,22 @@ class weldarray(np.ndarray):
         # array.
         assert isinstance(result, weldarray)
 
-        # Scenario 2: Non Inplace Op + Inplace Op on a non-view.
-        input1 = _update_input(input1)
-        input2 = _update_input(input2)
-
-        # Broadcasting arrays here because it (probably?) won't work with the
-        # way we're doing inplace ops.
-        if isinstance(input1, np.ndarray) and isinstance(input2, np.ndarray):
-            # we need to compare real shapes because the operations are lazily
-            # evaluated so shapes could be changing...
-            if (input1._real_shape != input2._real_shape):
-                if self._verbose: print('broadcasting!')
-                # need to broadcast the arrays!
-                input1, input2 = _broadcast_arrays(input1, input2)
-
         # scalars (i32, i64, f32, f64...)
         if not hasattr(input1, "__len__") or not hasattr(input2, "__len__"):
             _scalar_binary_op(input1, input2, binop, result)
         else:
             # update result's weldobj with the arrays it needs. We can be sure
             # that both the inputs are weldarrays by this point.
-            arr1 = input1._get_array_iter_code(result)
-            arr2 = input2._get_array_iter_code(result)
-            template2 = ('result(for(zip({arr1},{arr2}), appender,|b,i,e| merge(b,e.$0'
-            ' {binop} e.$1)))')
-            result.weldobj.weld_code = template2.format(arr1 = arr1,
-                                                        arr2  = arr2,
-                                                        binop = binop)
-            # Important to have the correct shape. Since we have already done
-            # broadcast, this must be right.
-            assert input1._real_shape == input2._real_shape, 'test shapes of inputs'
-            result._real_shape = input1._real_shape
+            arr1 = input1._get_broadcast_iter_code(result, shape)
+            arr2 = input2._get_broadcast_iter_code(result, shape)
+            ty = result._weld_type
+            field1 = lambda e: input1._cast_code(ir.GetField(e, 0), ty)
+            field2 = lambda e: input2._cast_code(ir.GetField(e, 1), ty)
+            if binop == "pow":
+                update = lambda e: ir.Call(binop, [field1(e), field2(e)])
+            else:
+                update = lambda e: ir.BinOp(binop, field1(e), field2(e))
+            result.weldobj.weld_code = ir.map_vec(ir.Zip([arr1, arr2]), update)
+            # Important to have the correct shape.
+            result._real_shape = shape
         return result
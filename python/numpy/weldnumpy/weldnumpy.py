@@ -1,5 +1,9 @@
+import multiprocessing
+import os
+import threading
 import numpy as np
 import scipy.special as ss
+import weld.cache as cache
 from weld.types import *
 from distutils.version import StrictVersion
 assert StrictVersion(np.__version__) >= StrictVersion('1.13')
@@ -7,8 +11,20 @@ assert StrictVersion(np.__version__) >= StrictVersion('1.13')
 ALL_PASSES = ["loop-fusion", "infer-size", "short-circuit-booleans",
         "predicate", "vectorize", "fix-iterate"]
 CUR_PASSES = ALL_PASSES
+# evaluate weldarrays and assign with NumPy in __setitem__, or register the
+# assignment lazily in weld (see weldarray._setitem_lazy).
 offload_setitem = True
+# Tiered execution: evaluate programs which have not been compiled yet with
+# NumPy, while they are compiled in the background.
+tiered = False
 MAX_REGISTERED_OPS = 100
+# lazy assignments to fewer than 1/SETITEM_DICT_RATIO of an array's elements
+# look up the new values in a dictionary with an entry per element being set,
+# instead of in an array with a position per element of the array.
+SETITEM_DICT_RATIO = 8
+# number of threads weld programs are run with.
+num_threads = (int(os.environ.get("WELD_NUM_THREADS", 0)) or
+        multiprocessing.cpu_count())
 
 class weldarray_view():
     '''
@@ -36,6 +52,126 @@ class weldarray_view():
         self.shape = shape
         self.strides = strides
 
+def set_tiered(enabled):
+    '''
+    Enables or disables tiered execution.
+    '''
+    global tiered
+    tiered = enabled
+
+def set_num_threads(n):
+    '''
+    Sets the number of threads weld programs are run with.
+    '''
+    global num_threads
+    num_threads = n
+
+class numpy_thunk():
+    '''
+    Computes the value of a weldarray eagerly with NumPy, by applying the ufunc
+    that produced it to the values of its inputs. Used for tiered execution.
+    '''
+    def __init__(self, ufunc, args, kwargs, dtype):
+        '''
+        @ufunc: NumPy ufunc.
+        @args: ufunc inputs: numpy_thunks, ndarrays or scalars.
+        @kwargs: ufunc keyword arguments (other than out).
+        @dtype: dtype of the weldarray computed by this thunk.
+        '''
+        self.ufunc = ufunc
+        self.args = args
+        self.kwargs = kwargs
+        self.dtype = dtype
+
+    def compute(self, memo=None):
+        '''
+        @memo: dict from id(thunk) to values, so that thunks shared by several
+        inputs are only computed once.
+        @ret: ndarray.
+        '''
+        if memo is None:
+            memo = {}
+        if id(self) not in memo:
+            args = [a.compute(memo) if isinstance(a, numpy_thunk) else a
+                    for a in self.args]
+            result = self.ufunc(*args, **self.kwargs)
+            memo[id(self)] = np.asarray(result).astype(self.dtype, copy=False)
+        return memo[id(self)]
+
+_compiling = set()
+# programs which failed to compile
+_failed = set()
+_compiling_lock = threading.Lock()
+
+def _module_key(weldobj, passes):
+    '''
+    @ret: the module cache key of the program of weldobj. Generating the
+    program is not free, so the key is kept on weldobj, until its code or the
+    compile options are replaced.
+    '''
+    cached = getattr(weldobj, '_module_key', None)
+    if (cached is not None and cached[0] is weldobj.weld_code and
+            cached[1] == passes and
+            cached[2][2] == tuple(sorted(cache.compile_options.items()))):
+        return cached[2]
+    key = cache.module_key(weldobj.to_weld_func(), passes)
+    weldobj._module_key = (weldobj.weld_code,
+            None if passes is None else list(passes), key)
+    return key
+
+def weld_module_ready(weldobj, passes):
+    '''
+    Checks if the program of weldobj has already been compiled. If not, starts
+    compiling it in a background thread into the module cache.
+    @ret: bool, True if the program should be evaluated with Weld.
+    '''
+    if cache.module_cache.capacity <= 0:
+        # the compiled module would not be kept anyway.
+        return True
+    key = _module_key(weldobj, passes)
+    if key in cache.module_cache:
+        return True
+    with _compiling_lock:
+        if key in _failed:
+            # evaluating it with Weld will report the error.
+            return True
+        if key in _compiling:
+            return False
+        _compiling.add(key)
+
+    def compile_module():
+        try:
+            module = cache.compile_module(key[0], passes, key[2])
+        except ValueError:
+            with _compiling_lock:
+                _failed.add(key)
+        else:
+            cache.module_cache.put(key, module)
+        with _compiling_lock:
+            _compiling.discard(key)
+
+    thread = threading.Thread(target=compile_module)
+    thread.daemon = True
+    thread.start()
+    return False
+
+def broadcast_shape(shape1, shape2):
+    '''
+    @ret: tuple, the shape that arrays of shapes shape1 and shape2 are
+    broadcast to by NumPy, or None if they can't be broadcast together.
+    '''
+    shape1 = tuple(shape1)
+    shape2 = tuple(shape2)
+    ndim = max(len(shape1), len(shape2))
+    shape1 = (1,)*(ndim - len(shape1)) + shape1
+    shape2 = (1,)*(ndim - len(shape2)) + shape2
+    shape = []
+    for d1, d2 in zip(shape1, shape2):
+        if d1 != d2 and d1 != 1 and d2 != 1:
+            return None
+        shape.append(d2 if d1 == 1 else d1)
+    return tuple(shape)
+
 def is_view_child(view, par):
     '''
     Checks the base address of the given arrays to figure out if child and par
@@ -91,6 +227,16 @@ def get_supported_unary_ops():
     unary_ops[ss.erf.__name__] = 'erf'
     return unary_ops
 
+def get_supported_reduce_ops():
+    '''
+    Returns a dictionary of the ufuncs whose reductions are supported, with
+    values being the Weld symbol of their (commutative) merger op.
+    '''
+    reduce_ops = {}
+    reduce_ops[np.add.__name__] = '+'
+    reduce_ops[np.multiply.__name__] = '*'
+    return reduce_ops
+
 def get_supported_cmp_ops():
     cmp_ops = {}
     cmp_ops[np.less_equal.__name__] = '<='
@@ -125,6 +271,7 @@ def get_supported_suffixes():
 # Global variables for the WeldArray type, used for lookups
 BINARY_OPS = get_supported_binary_ops()
 UNARY_OPS = get_supported_unary_ops()
+REDUCE_OPS = get_supported_reduce_ops()
 CMP_OPS = get_supported_cmp_ops()
 SUPPORTED_DTYPES = get_supported_types()
 DTYPE_SUFFIXES = get_supported_suffixes()
@@ -182,3 +329,21 @@ def add_ops(ops):
 def set_offload_setitem(val):
     global offload_setitem
     offload_setitem = val
+
+def result_dtype(ufunc, inputs):
+    '''
+    Applies NumPy's type promotion rules for ufunc to the given inputs, by
+    applying ufunc to one element arrays of the same dtypes as the array
+    inputs. The scalar inputs are passed as they are, since the promotion of
+    scalars can depend on their values (e.g., float32 array * 2.0 is float32).
+    @inputs: list of ndarrays or scalars.
+    @ret: np.dtype of ufunc's result, or None if NumPy can't apply ufunc to
+    inputs.
+    '''
+    args = [np.ones(1, dtype=i.dtype) if isinstance(i, np.ndarray) else i
+            for i in inputs]
+    try:
+        with np.errstate(all='ignore'):
+            return np.asarray(ufunc(*args)).dtype
+    except (TypeError, ValueError, OverflowError):
+        return None
@@ -66,5 +66,7 @@ setup(name='pyweld',
       url='https://github.com/weld-project/weld',
       author='Weld Developers',
       author_email='weld-group@lists.stanford.edu',
-      install_requires=['pandas', 'numpy'],
+      install_requires=['pandas', 'numpy',
+                        # concurrent.futures, for WeldObject.evaluate_async
+                        'futures; python_version<"3"'],
       ext_modules=[module1])
@@ -0,0 +1,50 @@
+#!/usr/bin/python
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import weld.cache as cache
+
+
+class CacheTestMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_module_key_options(self):
+        code = "|_inp0:vec[i64]| map(_inp0, |e| e + 1L)"
+        key = cache.module_key(code)
+        cache.set_compile_option("weld.llvm.optimization.level", 3)
+        try:
+            self.assertNotEqual(key, cache.module_key(code))
+        finally:
+            cache.set_compile_option("weld.llvm.optimization.level", None)
+        self.assertEqual(key, cache.module_key(code))
+
+    def test_put_without_ir(self):
+        disk_cache = cache.DiskModuleCache(self.directory)
+        disk_cache.put("key", None)
+        self.assertEqual([], os.listdir(self.directory))
+        self.assertIsNone(disk_cache.get("key"))
+
+    def test_evict_stale_tmp(self):
+        disk_cache = cache.DiskModuleCache(self.directory)
+        stale = os.path.join(self.directory, "stale.tmp")
+        recent = os.path.join(self.directory, "recent.tmp")
+        for path in (stale, recent):
+            open(path, "wb").close()
+        old = time.time() - 2 * cache._STALE_TMP_SECONDS
+        os.utime(stale, (old, old))
+        disk_cache.put("key", "llvm ir")
+        self.assertEqual(["key.ll", "recent.tmp"],
+                         sorted(os.listdir(self.directory)))
+
+
+if __name__ == '__main__':
+    unittest.main()
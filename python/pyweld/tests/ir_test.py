@@ -0,0 +1,102 @@
+#!/usr/bin/python
+
+import unittest
+
+import weld.ir as ir
+from weld.types import *
+
+
+class IRTestMethods(unittest.TestCase):
+
+    def test_literals(self):
+        self.assertEqual("2.0F", str(ir.Literal(2.0, WeldFloat())))
+        self.assertEqual("3", str(ir.Literal(3, WeldInt())))
+        self.assertEqual("(-1L)", str(ir.Literal(-1, WeldLong())))
+        self.assertEqual("1.0e20", str(ir.Literal(1e20, WeldDouble())))
+        self.assertRaises(ValueError, ir.literal, 1.5, WeldLong())
+        self.assertRaises(ValueError, ir.literal, float("nan"), WeldDouble())
+
+    def test_integer_literal_bounds(self):
+        self.assertEqual("127c", ir.literal(127, WeldChar()))
+        self.assertEqual("((-127c) - 1c)", ir.literal(-128, WeldChar()))
+        self.assertEqual("2147483647", ir.literal(2 ** 31 - 1, WeldInt()))
+        self.assertEqual("((-2147483647) - 1)",
+                         ir.literal(-2 ** 31, WeldInt()))
+        self.assertEqual("((-9223372036854775807L) - 1L)",
+                         ir.literal(-2 ** 63, WeldLong()))
+        self.assertRaises(ValueError, ir.literal, 128, WeldChar())
+        self.assertRaises(ValueError, ir.literal, -129, WeldChar())
+        self.assertRaises(ValueError, ir.literal, 2 ** 31, WeldInt())
+        self.assertRaises(ValueError, ir.literal, 2 ** 63, WeldLong())
+
+    def test_structural_equality(self):
+        x = ir.BinOp("+", ir.Raw("a"), ir.Raw("b"))
+        y = ir.BinOp("+", ir.Raw("a"), ir.Raw("b"))
+        self.assertEqual(x, y)
+        self.assertEqual(hash(x), hash(y))
+        self.assertNotEqual(x, ir.BinOp("-", ir.Raw("a"), ir.Raw("b")))
+
+    def test_map_vec(self):
+        code = ir.map_vec(ir.Raw("v"), lambda e: ir.Call("exp", [e]))
+        self.assertEqual(
+            "result(for(v, appender, |b, i, e| merge(b, exp(e))))", str(code))
+
+    def test_shared_subexpression(self):
+        x = ir.BinOp("+", ir.Raw("a"), ir.Raw("b"))
+        self.assertEqual("(let _e0 = (a + b); (_e0 * _e0))",
+                         ir.serialize(ir.BinOp("*", x, x)))
+
+    def test_shared_subexpressions_order(self):
+        # Each let must be defined after the lets it uses.
+        n = ir.BinOp("*", ir.Raw("a"), ir.Raw("b"))
+        u = ir.BinOp("+", n, ir.Raw("c"))
+        self.assertEqual(
+            "(let _e0 = (a * b); let _e1 = (_e0 + c); {_e1, _e1, _e0})",
+            ir.serialize(ir.MakeStruct([u, u, n])))
+
+    def test_shared_with_parameters(self):
+        # Expressions using lambda parameters can't be moved out of the
+        # lambda.
+        code = ir.map_vec(ir.Raw("v"), lambda e: ir.BinOp(
+            "*", ir.BinOp("+", e, e), ir.BinOp("+", e, e)))
+        self.assertEqual(
+            "result(for(v, appender, |b, i, e| merge(b, ((e + e) * (e + e)))))",
+            ir.serialize(code))
+
+    def test_shared_lambda(self):
+        b, i, e = ir.Param("b"), ir.Param("i"), ir.Param("e")
+        func = ir.Lambda([b, i, e], ir.Merge(b, e))
+        code = ir.MakeStruct([
+            ir.Result(ir.For(ir.Raw("v"), ir.Appender(), func)),
+            ir.Result(ir.For(ir.Raw("w"), ir.Appender(), func))])
+        self.assertEqual(
+            "{result(for(v, appender, |b, i, e| merge(b, e))), "
+            "result(for(w, appender, |b, i, e| merge(b, e)))}",
+            ir.serialize(code))
+
+    def test_linear_size(self):
+        # Each doubling refers to the previous expression twice; without
+        # lets the code would grow exponentially.
+        code = ir.Raw("a")
+        for _ in range(30):
+            code = ir.BinOp("+", code, code)
+        self.assertTrue(len(ir.serialize(code)) < 1000)
+
+    def test_deep_expression(self):
+        # Long chains of operations are traversed without recursion.
+        def chain():
+            code = ir.Raw("a")
+            for i in range(10000):
+                code = ir.BinOp("+", code, ir.Literal(i, WeldLong()))
+            return code
+        x, y = chain(), chain()
+        self.assertEqual(x, y)
+        self.assertEqual(hash(x), hash(y))
+        self.assertEqual(frozenset(), x.free_params())
+        self.assertTrue(x.key())
+        code = ir.serialize(x)
+        self.assertTrue(code.startswith("(" * 10000 + "a + 0L)"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+#!/usr/bin/python
+
+import numpy as np
+import threading
+import unittest
+
+import weld.weldobject as wo
+from weld.encoders import NumpyArrayEncoder, NumpyArrayDecoder
+from weld.types import *
+
+
+def new_object():
+    return wo.WeldObject(NumpyArrayEncoder(), NumpyArrayDecoder())
+
+
+def add_scalar(a, value):
+    """
+    Returns an object computing a + value, with value added as a literal.
+    """
+    obj = new_object()
+    name = obj.update(a)
+    obj.weld_code = "map(%s, |e| e + %s)" % (
+        name, obj.literal(value, WeldLong()))
+    return obj
+
+
+class WeldObjectTestMethods(unittest.TestCase):
+
+    def test_hoisted_literal_dependency(self):
+        hoist_literals = wo._hoist_literals
+        wo.set_hoist_literals(True)
+        try:
+            a = np.arange(10, dtype=np.int64)
+            obj1 = add_scalar(a, 2)
+            obj2 = new_object()
+            obj2.update(obj1)
+            obj2.dependencies[obj1.obj_id] = obj1
+            obj2.weld_code = "map(%s, |e| e * %s)" % (
+                obj1.obj_id, obj2.literal(3, WeldLong()))
+            result = obj2.evaluate(WeldVec(WeldLong()))
+            self.assertTrue(np.array_equal((a + 2) * 3, result))
+        finally:
+            wo.set_hoist_literals(hoist_literals)
+
+    def test_evaluate_async(self):
+        a = np.arange(10, dtype=np.int64)
+        obj = add_scalar(a, 1)
+        future = obj.evaluate_async(WeldVec(WeldLong()))
+        self.assertTrue(np.array_equal(a + 1, future.result()))
+
+    def test_evaluate_async_concurrent(self):
+        wo.set_executor_threads(4)
+        try:
+            inputs = [np.arange(i, i + 100, dtype=np.int64) for i in range(16)]
+            futures = [add_scalar(a, i).evaluate_async(WeldVec(WeldLong()))
+                       for i, a in enumerate(inputs)]
+            for i, (a, future) in enumerate(zip(inputs, futures)):
+                self.assertTrue(np.array_equal(a + i, future.result()))
+        finally:
+            wo.set_executor_threads()
+
+    def test_evaluate_async_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            a = np.arange(10, dtype=np.int64)
+            future = add_scalar(a, 5).evaluate_async(WeldVec(WeldLong()),
+                                                     executor=executor)
+            self.assertTrue(np.array_equal(a + 5, future.result()))
+        finally:
+            executor.shutdown()
+
+    def test_evaluate_async_error(self):
+        obj = new_object()
+        obj.update(np.arange(10, dtype=np.int64))
+        obj.weld_code = "this is not weld code"
+        future = obj.evaluate_async(WeldVec(WeldLong()))
+        self.assertRaises(ValueError, future.result)
+
+    @unittest.skipIf(wo.asyncio is None, "asyncio requires Python 3.4+")
+    def test_evaluate_awaitable(self):
+        loop = wo.asyncio.new_event_loop()
+        try:
+            a = np.arange(10, dtype=np.int64)
+            future = add_scalar(a, 2).evaluate_awaitable(WeldVec(WeldLong()),
+                                                         loop=loop)
+            self.assertTrue(np.array_equal(a + 2,
+                                           loop.run_until_complete(future)))
+        finally:
+            loop.close()
+
+    @unittest.skipIf(wo.asyncio is not None, "asyncio is available")
+    def test_evaluate_awaitable_unavailable(self):
+        obj = add_scalar(np.arange(10, dtype=np.int64), 2)
+        self.assertRaises(NotImplementedError, obj.evaluate_awaitable,
+                          WeldVec(WeldLong()))
+
+    def test_evaluate_many(self):
+        a = np.arange(10, dtype=np.int64)
+        obj1 = add_scalar(a, 1)
+        obj2 = add_scalar(a, 2)
+        results = wo.evaluate_many([obj1, obj2],
+                                   [WeldVec(WeldLong()), WeldVec(WeldLong())])
+        self.assertTrue(np.array_equal(a + 1, results[0]))
+        self.assertTrue(np.array_equal(a + 2, results[1]))
+        # The shared input is passed once.
+        self.assertEqual(a.nbytes, obj1.metrics.input_bytes)
+        self.assertEqual(2 * a.nbytes, obj1.metrics.output_bytes)
+        self.assertIs(obj1.metrics, obj2.metrics)
+
+    def test_metrics(self):
+        # Every kind of evaluation reports its metrics.
+        reported = []
+        wo.set_metrics_callback(reported.append)
+        try:
+            a = np.arange(10, dtype=np.int64)
+            obj = add_scalar(a, 1)
+            obj.evaluate(WeldVec(WeldLong()))
+            self.assertIs(obj.metrics, reported[-1])
+            self.assertEqual(a.nbytes, obj.metrics.input_bytes)
+
+            compiled = obj.compile(WeldVec(WeldLong()))
+            compiled(np.arange(20, dtype=np.int64))
+            self.assertIs(compiled.metrics, reported[-1])
+            self.assertEqual(2 * a.nbytes, compiled.metrics.input_bytes)
+
+            obj.evaluate_async(WeldVec(WeldLong())).result()
+            self.assertIs(obj.metrics, reported[-1])
+            self.assertEqual(3, len(reported))
+        finally:
+            wo.set_metrics_callback(None)
+
+    def test_concurrent_naming(self):
+        # Objects are built and evaluated from several threads at once; their
+        # IDs and the names of distinct inputs must stay unique, and a shared
+        # input must get a single name.
+        num_threads = 8
+        num_objects = 50
+        shared = np.arange(10, dtype=np.int64)
+        results = [None] * num_threads
+
+        def build(index):
+            obj_ids = []
+            names = []
+            inputs = []
+            shared_names = set()
+            failures = []
+            for i in range(num_objects):
+                a = np.arange(i, i + 10, dtype=np.int64)
+                inputs.append(a)
+                obj = add_scalar(a, i)
+                obj_ids.append(obj.obj_id)
+                names.extend(obj.context.keys())
+                shared_names.add(obj.update(shared))
+                if i % 10 == 0:
+                    result = obj.evaluate(WeldVec(WeldLong()))
+                    if not np.array_equal(a + i, result):
+                        failures.append(i)
+            results[index] = (obj_ids, names, inputs, shared_names, failures)
+
+        threads = [threading.Thread(target=build, args=(i,))
+                   for i in range(num_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        obj_ids = []
+        names = []
+        shared_names = set()
+        for result in results:
+            self.assertEqual([], result[4])
+            obj_ids.extend(result[0])
+            names.extend(result[1])
+            shared_names |= result[3]
+        self.assertEqual(num_threads * num_objects, len(set(obj_ids)))
+        self.assertEqual(num_threads * num_objects, len(set(names)))
+        self.assertEqual(1, len(shared_names))
+        self.assertFalse(shared_names & set(names))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1 @@
+from weldobject import WeldObject, evaluate_many
@@ -38,30 +38,94 @@ class c_weld_err(c_void_p):
 class c_weld_value(c_void_p):
     pass
 
-class WeldModule(c_void_p):
+def _prototype(name, restype, argtypes):
+    """
+    Returns the libweld function `name`, with its result and argument types
+    declared.
+    """
+    func = getattr(weld, name)
+    func.restype = restype
+    func.argtypes = argtypes
+    return func
+
+# The libweld entry points are typed once, when the library is loaded, so
+# that calls through the wrappers below do not repeat the symbol lookup.
+weld_module_compile = _prototype(
+    "weld_module_compile", c_weld_module, [c_char_p, c_weld_conf, c_weld_err])
+weld_module_load = _prototype(
+    "weld_module_load", c_weld_module,
+    [c_char_p, c_char_p, c_weld_conf, c_weld_err])
+weld_module_llvm_ir = _prototype(
+    "weld_module_llvm_ir", c_char_p, [c_weld_module])
+weld_module_stats = _prototype(
+    "weld_module_stats", c_char_p, [c_weld_module])
+# module, conf, arg, &err
+weld_module_run = _prototype(
+    "weld_module_run", c_weld_value,
+    [c_weld_module, c_weld_conf, c_weld_value, c_weld_err])
+weld_module_free = _prototype("weld_module_free", None, [c_weld_module])
+
+weld_value_new = _prototype("weld_value_new", c_weld_value, [c_void_p])
+weld_value_data = _prototype("weld_value_data", c_void_p, [c_weld_value])
+weld_value_memory_usage = _prototype(
+    "weld_value_memory_usage", c_int64, [c_weld_value])
+weld_value_free = _prototype("weld_value_free", None, [c_weld_value])
+
+weld_conf_new = _prototype("weld_conf_new", c_weld_conf, [])
+weld_conf_get = _prototype(
+    "weld_conf_get", c_char_p, [c_weld_conf, c_char_p])
+weld_conf_set = _prototype(
+    "weld_conf_set", None, [c_weld_conf, c_char_p, c_char_p])
+weld_conf_free = _prototype("weld_conf_free", None, [c_weld_conf])
+
+weld_error_new = _prototype("weld_error_new", c_weld_err, [])
+weld_error_code = _prototype("weld_error_code", c_uint64, [c_weld_err])
+weld_error_message = _prototype(
+    "weld_error_message", c_char_p, [c_weld_err])
+weld_error_free = _prototype("weld_error_free", None, [c_weld_err])
+
+_weld_set_log_level = _prototype("weld_set_log_level", None, [c_int])
+
 
-    def __init__(self, code, conf, err):
-        weld_module_compile = weld.weld_module_compile
-        weld_module_compile.argtypes = [
-            c_char_p, c_weld_conf, c_weld_err]
-        weld_module_compile.restype = c_weld_module
+class WeldModule(c_void_p):
 
+    def __init__(self, code, conf, err, llvm_ir=None):
+        """
+        Compiles `code`. If `llvm_ir` is given, the module is instead loaded
+        from the optimized LLVM IR of a module compiled from the same code.
+        """
         code = c_char_p(code)
-        self.module = weld_module_compile(code, conf.conf, err.error)
+        if llvm_ir is None:
+            self.module = weld_module_compile(code, conf.conf, err.error)
+        else:
+            llvm_ir = c_char_p(llvm_ir)
+            self.module = weld_module_load(
+                code, llvm_ir, conf.conf, err.error)
+
+    def llvm_ir(self):
+        val = weld_module_llvm_ir(self.module)
+        return copy.copy(val)
+
+    def stats(self):
+        """
+        Returns the compilation statistics of the module, as a dictionary
+        mapping "weld" (compiler phases), "passes" (optimization passes) and
+        "llvm" (LLVM stages) to dictionaries from step names to durations in
+        seconds.
+        """
+        stats = {"weld": {}, "passes": {}, "llvm": {}}
+        for line in weld_module_stats(self.module).splitlines():
+            category, name, micros = line.split("\t")
+            times = stats.setdefault(category, {})
+            # Steps which ran several times (e.g., repeated passes) are summed.
+            times[name] = times.get(name, 0.0) + int(micros) / 1e6
+        return stats
 
     def run(self, conf, arg, err):
-        weld_module_run = weld.weld_module_run
-        # module, conf, arg, &err
-        weld_module_run.argtypes = [
-            c_weld_module, c_weld_conf, c_weld_value, c_weld_err]
-        weld_module_run.restype = c_weld_value
         ret = weld_module_run(self.module, conf.conf, arg.val, err.error)
         return WeldValue(ret, assign=True)
 
     def __del__(self):
-        weld_module_free = weld.weld_module_free
-        weld_module_free.argtypes = [c_weld_module]
-        weld_module_free.restype = None
         weld_module_free(self.module)
 
 
@@ -69,9 +133,6 @@ class WeldValue(c_void_p):
 
     def __init__(self, value, assign=False):
         if assign is False:
-            weld_value_new = weld.weld_value_new
-            weld_value_new.argtypes = [c_void_p]
-            weld_value_new.restype = c_weld_value
             self.val = weld_value_new(value)
         else:
             self.val = value
@@ -83,23 +144,14 @@ class WeldValue(c_void_p):
 
     def data(self):
         self._check()
-        weld_value_data = weld.weld_value_data
-        weld_value_data.argtypes = [c_weld_value]
-        weld_value_data.restype = c_void_p
         return weld_value_data(self.val)
 
     def memory_usage(self):
         self._check()
-        weld_value_memory_usage = weld.weld_value_memory_usage
-        weld_value_memory_usage.argtypes = [c_weld_value]
-        weld_value_memory_usage.restype = c_int64
         return weld_value_memory_usage(self.val)
 
     def free(self):
         self._check()
-        weld_value_free = weld.weld_value_free
-        weld_value_free.argtypes = [c_weld_value]
-        weld_value_free.restype = None
         self.freed = True
         return weld_value_free(self.val)
 
@@ -107,59 +159,35 @@ class WeldValue(c_void_p):
 class WeldConf(c_void_p):
 
     def __init__(self):
-        weld_conf_new = weld.weld_conf_new
-        weld_conf_new.argtypes = []
-        weld_conf_new.restype = c_weld_conf
         self.conf = weld_conf_new()
 
     def get(self, key):
         key = c_char_p(key)
-        weld_conf_get = weld.weld_conf_get
-        weld_conf_get.argtypes = [c_weld_conf, c_char_p]
-        weld_conf_get.restype = c_char_p
         val = weld_conf_get(self.conf, key)
         return copy.copy(val)
 
     def set(self, key, value):
         key = c_char_p(key)
         value = c_char_p(value)
-        weld_conf_set = weld.weld_conf_set
-        weld_conf_set.argtypes = [c_weld_conf, c_char_p, c_char_p]
-        weld_conf_set.restype = None
         weld_conf_set(self.conf, key, value)
 
     def __del__(self):
-        weld_conf_free = weld.weld_conf_free
-        weld_conf_free.argtypes = [c_weld_conf]
-        weld_conf_free.restype = None
         weld_conf_free(self.conf)
 
 
 class WeldError(c_void_p):
 
     def __init__(self):
-        weld_error_new = weld.weld_error_new
-        weld_error_new.argtypes = []
-        weld_error_new.restype = c_weld_err
         self.error = weld_error_new()
 
     def code(self):
-        weld_error_code = weld.weld_error_code
-        weld_error_code.argtypes = [c_weld_err]
-        weld_error_code.restype = c_uint64
         return weld_error_code(self.error)
 
     def message(self):
-        weld_error_message = weld.weld_error_message
-        weld_error_message.argtypes = [c_weld_err]
-        weld_error_message.restype = c_char_p
         val = weld_error_message(self.error)
         return copy.copy(val)
 
     def __del__(self):
-        weld_error_free = weld.weld_error_free
-        weld_error_free.argtypes = [c_weld_err]
-        weld_error_free.restype = None
         weld_error_free(self.error)
 
 WeldLogLevelOff = 0
@@ -179,4 +207,4 @@ def weld_set_log_level(log_level):
         4 = Debug,
         5 = Trace.
      """
-     weld.weld_set_log_level(log_level)
+     _weld_set_log_level(log_level)
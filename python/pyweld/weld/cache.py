@@ -0,0 +1,346 @@
+#
+# Caches of compiled Weld modules.
+#
+
+import errno
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+
+from collections import OrderedDict
+
+import bindings as cweld
+
+# Names generated by WeldObject for inputs and intermediate objects. These
+# differ between otherwise identical programs, so they are renamed when
+# computing the canonical form of a program.
+_GENERATED_NAME_RE = re.compile(r'\b(_inp|obj)\d+\b')
+
+DEFAULT_CAPACITY = 128
+DEFAULT_DISK_CAPACITY = 1 << 30
+
+# Suffix of the files stored by DiskModuleCache.
+_MODULE_SUFFIX = ".ll"
+
+# Suffix of the temporary files DiskModuleCache writes entries to, and the age
+# in seconds after which such a file is assumed to be left over by a writer
+# that died, and is removed.
+_TMP_SUFFIX = ".tmp"
+_STALE_TMP_SECONDS = 3600
+
+# WeldConf settings, other than the optimization passes, which modules are
+# compiled with (e.g., "weld.llvm.optimization.level" or
+# "weld.compile.multithreadSupport"). They are part of the module keys, so
+# modules compiled with different settings are never shared.
+compile_options = {}
+
+
+def canonicalize(code):
+    """
+    Returns a canonical form of the Weld program `code`, where the names
+    generated by WeldObject are renumbered in order of first appearance.
+
+    Since a program's header lists its arguments (with their types) in
+    positional order, two programs with the same canonical form take the same
+    arguments in the same order, and can share a compiled module.
+    """
+    names = {}
+
+    def rename(match):
+        name = match.group(0)
+        if name not in names:
+            names[name] = "%s%d" % (match.group(1), len(names))
+        return names[name]
+
+    return _GENERATED_NAME_RE.sub(rename, code)
+
+
+def set_compile_option(name, value):
+    """
+    Compiles modules with the WeldConf setting `name` set to `value`, or with
+    Weld's default for `name` if `value` is None.
+    """
+    if value is None:
+        compile_options.pop(name, None)
+    else:
+        compile_options[name] = str(value)
+
+
+def module_key(code, passes=None):
+    """
+    Returns the key identifying the module compiled from `code` with the
+    optimization passes `passes` and the current compile options. The key is
+    a tuple (canonical program, passes, options).
+    """
+    if passes is not None:
+        passes = tuple(passes)
+    return (canonicalize(code), passes, tuple(sorted(compile_options.items())))
+
+
+class ModuleCache(object):
+    """
+    A bounded, least-recently-used cache of compiled WeldModules, which may be
+    shared by several threads.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._modules = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._modules)
+
+    def __contains__(self, key):
+        return key in self._modules
+
+    def get(self, key):
+        """
+        Returns the module stored under `key`, or None if there is no such
+        module.
+        """
+        with self._lock:
+            module = self._modules.pop(key, None)
+            if module is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # Re-insert the module to mark it as the most recently used one.
+            self._modules[key] = module
+            return module
+
+    def put(self, key, module):
+        """
+        Stores `module` under `key`, evicting the least recently used modules
+        if the cache is full.
+        """
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._modules.pop(key, None)
+            self._modules[key] = module
+            while len(self._modules) > self.capacity:
+                self._modules.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._modules.clear()
+
+
+def _libweld_digest():
+    """
+    Returns a digest of the loaded libweld, so that modules compiled by one
+    build of Weld are never loaded by another.
+    """
+    digest = hashlib.sha1()
+    with open(cweld.lib_file, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DiskModuleCache(object):
+    """
+    A cache of compiled Weld modules stored as optimized LLVM IR in a
+    directory, which can be shared by several processes.
+
+    Entries are written to a temporary file which is then atomically renamed,
+    so concurrent writers never expose a partially written module. When the
+    directory grows beyond `max_bytes`, the least recently used entries are
+    removed.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_DISK_CAPACITY):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._build = None
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def key(self, code, settings):
+        """
+        Returns the key of the module compiled from the canonical program
+        `code` with the configuration `settings`, a dictionary.
+        """
+        if self._build is None:
+            self._build = _libweld_digest()
+        digest = hashlib.sha1()
+        digest.update(self._build)
+        for item in sorted(settings.items()):
+            digest.update("\0%s=%s" % item)
+        digest.update("\0")
+        digest.update(code)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _MODULE_SUFFIX)
+
+    def get(self, key):
+        """
+        Returns the LLVM IR stored under `key`, or None if there is no such
+        entry.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                llvm_ir = f.read()
+            # Mark the entry as recently used.
+            os.utime(path, None)
+        except (IOError, OSError):
+            return None
+        return llvm_ir
+
+    def put(self, key, llvm_ir):
+        """
+        Stores `llvm_ir` under `key`, and evicts old entries if the cache is
+        over its size limit.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=_TMP_SUFFIX)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(llvm_ir)
+            os.rename(tmp_path, self._path(key))
+        except (IOError, OSError, TypeError):
+            # Another process may have stored the same module already, or
+            # there is no IR to store.
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits in
+        `max_bytes`, as well as stale temporary files.
+        """
+        entries = []
+        total = 0
+        stale = time.time() - _STALE_TMP_SECONDS
+        for name in os.listdir(self.directory):
+            is_tmp = name.endswith(_TMP_SUFFIX)
+            if not is_tmp and not name.endswith(_MODULE_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if is_tmp:
+                # Recent temporary files may still be written by another
+                # process.
+                if st.st_mtime < stale:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # Removed concurrently by another process.
+                pass
+            total -= size
+
+
+module_cache = ModuleCache(
+    int(os.environ.get("WELD_MODULE_CACHE_SIZE", DEFAULT_CAPACITY)))
+
+disk_cache = None
+
+
+def set_cache_dir(directory, max_bytes=DEFAULT_DISK_CAPACITY):
+    """
+    Enables the on-disk module cache in `directory`, or disables it if
+    `directory` is None.
+    """
+    global disk_cache
+    if directory is None:
+        disk_cache = None
+    else:
+        disk_cache = DiskModuleCache(directory, max_bytes)
+
+
+def compile_module(code, passes=None, options=None):
+    """
+    Compiles the canonical program `code` with the optimization passes
+    `passes` and the compile options `options` (a sequence of (name, value)
+    pairs, the current compile options by default), loading it from the
+    on-disk cache instead if it is enabled and holds the module.
+    """
+    if options is None:
+        options = compile_options.items()
+    settings = dict(options)
+    if passes is not None:
+        settings["weld.optimization.passes"] = ",".join(passes)
+
+    key = None
+    if disk_cache is not None:
+        key = disk_cache.key(code, settings)
+        llvm_ir = disk_cache.get(key)
+        if llvm_ir is not None:
+            conf = cweld.WeldConf()
+            for name, value in settings.items():
+                conf.set(name, value)
+            err = cweld.WeldError()
+            module = cweld.WeldModule(code, conf, err, llvm_ir=llvm_ir)
+            if err.code() == 0:
+                return module
+            # The stored module is unusable (e.g., truncated by a full
+            # disk), so compile the program and replace it.
+        settings["weld.compile.exportLLVM"] = "true"
+
+    conf = cweld.WeldConf()
+    for name, value in settings.items():
+        conf.set(name, value)
+    err = cweld.WeldError()
+    module = cweld.WeldModule(code, conf, err)
+    if err.code() != 0:
+        raise ValueError("Could not compile function {}: {}".format(
+            code, err.message()))
+    if key is not None:
+        llvm_ir = module.llvm_ir()
+        if llvm_ir is not None:
+            disk_cache.put(key, llvm_ir)
+    return module
+
+
+def get_module(code, passes=None):
+    """
+    Returns a compiled module for the program `code`, reusing a cached module
+    compiled from an equivalent program when possible.
+    """
+    key = module_key(code, passes)
+    module = module_cache.get(key)
+    if module is None:
+        module = compile_module(key[0], passes, key[2])
+        module_cache.put(key, module)
+    return module
+
+
+if "WELD_LLVM_OPTIMIZATION_LEVEL" in os.environ:
+    set_compile_option("weld.llvm.optimization.level",
+                       os.environ["WELD_LLVM_OPTIMIZATION_LEVEL"])
+if "WELD_MULTITHREAD_SUPPORT" in os.environ:
+    set_compile_option("weld.compile.multithreadSupport",
+                       os.environ["WELD_MULTITHREAD_SUPPORT"])
+
+if "WELD_CACHE_DIR" in os.environ:
+    set_cache_dir(os.environ["WELD_CACHE_DIR"],
+                  int(os.environ.get("WELD_CACHE_MAX_BYTES",
+                                     DEFAULT_DISK_CAPACITY)))
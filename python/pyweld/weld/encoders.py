@@ -48,47 +48,63 @@ class NumpyArrayEncoder(WeldObjectEncoder):
         return WeldVec(dtype_to_weld_type(obj.dtype))
 
 
+class WeldBuffer(object):
+    """
+    Exposes memory owned by a Weld result to NumPy through the array
+    interface. Arrays created from a WeldBuffer keep it as their base, so the
+    result's owner stays alive as long as any of them does.
+    """
+
+    def __init__(self, address, shape, dtype, owner=None):
+        self.owner = owner
+        dtype = np.dtype(dtype)
+        self.__array_interface__ = {
+            "data": (address, False),
+            "shape": shape,
+            "typestr": dtype.str,
+            "version": 3,
+        }
+
+
+def weld_to_numpy_array(address, shape, dtype, owner=None):
+    """
+    Returns a NumPy array viewing the Weld memory at `address` without
+    copying it. `owner` is kept alive as long as the array (or any view of
+    it) is.
+    """
+    if not address or 0 in shape:
+        return np.empty(shape, dtype=dtype)
+    array = np.asarray(WeldBuffer(address, shape, dtype, owner))
+    # The array interface only carries the item size of structured dtypes.
+    return array.view(dtype)
+
+
 class NumpyArrayDecoder(WeldObjectDecoder):
+    takes_ownership = True
 
-    def decode(self, obj, restype):
-        # This stuff is same as grizzly.
+    def decode(self, obj, restype, owner=None):
+        # Scalars are read straight from the result.
         if restype == WeldInt():
-            data = cweld.WeldValue(obj).data()
-            result = ctypes.cast(data, ctypes.POINTER(c_int)).contents.value
-            return np.int32(result)
+            return np.int32(obj.contents.value)
         elif restype == WeldLong():
-            data = cweld.WeldValue(obj).data()
-            result = ctypes.cast(data, ctypes.POINTER(c_long)).contents.value
-            return np.int64(result)
+            return np.int64(obj.contents.value)
         elif restype == WeldFloat():
-            data = cweld.WeldValue(obj).data()
-            result = ctypes.cast(data, ctypes.POINTER(c_float)).contents.value
-            return np.float32(result)
+            return np.float32(obj.contents.value)
         elif restype == WeldDouble():
-            data = cweld.WeldValue(obj).data()
-            result = ctypes.cast(data, ctypes.POINTER(c_double)).contents.value
-            return np.float64(result) 
+            return np.float64(obj.contents.value)
 
-        # is a WeldVec() - depending on the types, need to make minor changes.
+        # is a WeldVec() - the result views the vector's buffer, and keeps
+        # the Weld value it belongs to alive.
         assert isinstance(restype, WeldVec)
         obj = obj.contents
-        size = obj.size
-        data = obj.ptr
-        dtype = restype.elemType.ctype_class
-
-        if restype == WeldVec(WeldInt()) or restype == WeldVec(WeldFloat()):
-            # these have same sizes.
-            ArrayType = ctypes.c_float*size
-        elif restype == WeldVec(WeldLong()) or restype == WeldVec(WeldDouble()):
-            ArrayType = ctypes.c_double*size
-        
-        array_pointer = ctypes.cast(data, ctypes.POINTER(ArrayType))
-        result = np.frombuffer(array_pointer.contents, dtype=dtype,count=size)
-        return result
+        address = ctypes.cast(obj.ptr, ctypes.c_void_p).value
+        dtype = np.dtype(restype.elemType.ctype_class)
+        return weld_to_numpy_array(address, (obj.size,), dtype, owner)
 
 class ScalarDecoder(WeldObjectDecoder):
+    takes_ownership = True
 
-    def decode(self, obj, restype):
+    def decode(self, obj, restype, owner=None):
         assert isinstance(restype, WeldLong)
         result = obj.contents.value
         return result
@@ -0,0 +1,585 @@
+#
+# A small expression tree for building Weld programs.
+#
+# Libraries can build the code of a WeldObject from these nodes instead of
+# formatting strings. Nodes are immutable and may be shared: an expression
+# used in several places is serialized once and bound to a let, so the program
+# text grows linearly with the size of the expression graph.
+#
+
+class Expr(object):
+    """
+    Base class of Weld expressions.
+
+    Expressions hash and compare structurally. Subclasses list their fields
+    in `_fields`; fields which are expressions are the node's children.
+
+    Expressions may be deeply nested (e.g., a long chain of lazy operations),
+    so their graphs are always traversed iteratively, and per-node results are
+    computed in post-order from the cached results of the children.
+    """
+    _fields = ()
+    # Builders are linear, so builder expressions are never bound to lets
+    # even if they are shared.
+    is_builder = False
+
+    def __init__(self, *values):
+        assert len(values) == len(self._fields)
+        for name, value in zip(self._fields, values):
+            setattr(self, name, value)
+        self._key = None
+        self._hash = None
+        self._free = None
+
+    def children(self):
+        """
+        Returns the sub-expressions of this expression.
+        """
+        result = []
+        for name in self._fields:
+            value = getattr(self, name)
+            if isinstance(value, Expr):
+                result.append(value)
+            elif isinstance(value, (list, tuple)):
+                result.extend(v for v in value if isinstance(v, Expr))
+        return result
+
+    def _make_key(self, child_key):
+        """
+        Returns a tuple of the class and fields of this node, where each child
+        is replaced by `child_key(child)`.
+        """
+        parts = [self.__class__.__name__]
+        for name in self._fields:
+            value = getattr(self, name)
+            if isinstance(value, Expr):
+                parts.append(child_key(value))
+            elif isinstance(value, (list, tuple)):
+                parts.append(tuple(child_key(v) if isinstance(v, Expr) else v
+                                   for v in value))
+            else:
+                parts.append(value)
+        return tuple(parts)
+
+    def key(self):
+        """
+        Returns a hashable value identifying the structure of this expression.
+        """
+        if self._key is None:
+            for node in _postorder(self, lambda n: n._key is not None):
+                node._key = node._make_key(lambda child: child._key)
+        return self._key
+
+    def free_params(self):
+        """
+        Returns the set of lambda parameters used, but not bound, by this
+        expression.
+        """
+        if self._free is None:
+            for node in _postorder(self, lambda n: n._free is not None):
+                node._free = node._free_params()
+        return self._free
+
+    def _free_params(self):
+        """
+        Returns the free parameters of this node, given those of its children.
+        """
+        free = set()
+        for child in self.children():
+            free |= child._free
+        return frozenset(free)
+
+    def __hash__(self):
+        if self._hash is None:
+            for node in _postorder(self, lambda n: n._hash is not None):
+                node._hash = hash(node._make_key(lambda child: child._hash))
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, Expr):
+            return NotImplemented
+        return _equal(self, other)
+
+    def __ne__(self, other):
+        if not isinstance(other, Expr):
+            return NotImplemented
+        return not self == other
+
+    def __str__(self):
+        return serialize(self)
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, serialize(self))
+
+    def _to_str(self, emit):
+        """
+        Returns the Weld code of this node, where `emit` returns the code of
+        a child expression.
+        """
+        raise NotImplementedError
+
+
+# Stands for the children of nodes whose fields are compared by _equal.
+_CHILD = object()
+
+
+def _postorder(expr, skip=None, uses=None):
+    """
+    Returns the distinct nodes (by identity) of `expr` in post-order, so that
+    every node comes after its children. Nodes for which `skip(node)` is true
+    are left out together with their children. If `uses` is given, it is
+    filled with the number of uses of each node, by id.
+    """
+    seen = set()
+    order = []
+    stack = [(expr, False)]
+    while stack:
+        node, visited = stack.pop()
+        if visited:
+            order.append(node)
+            continue
+        if id(node) in seen:
+            if uses is not None:
+                uses[id(node)] += 1
+            continue
+        if skip is not None and skip(node):
+            continue
+        seen.add(id(node))
+        if uses is not None:
+            uses[id(node)] = 1
+        stack.append((node, True))
+        stack.extend((child, False) for child in node.children())
+    return order
+
+
+def _equal(a, b):
+    """
+    Returns whether the expressions `a` and `b` have the same structure.
+    """
+    compared = set()
+    stack = [(a, b)]
+    while stack:
+        x, y = stack.pop()
+        if x is y or (id(x), id(y)) in compared:
+            continue
+        compared.add((id(x), id(y)))
+        if (hash(x) != hash(y) or
+                x._make_key(lambda child: _CHILD) !=
+                y._make_key(lambda child: _CHILD)):
+            return False
+        stack.extend(zip(x.children(), y.children()))
+    return True
+
+
+def as_expr(code):
+    """
+    Returns `code` if it is an expression, and the Raw expression of the
+    string `code` otherwise.
+    """
+    if isinstance(code, Expr):
+        return code
+    return Raw(str(code))
+
+
+def _code(value, emit):
+    """
+    Returns the code of `value`, an expression or a string of Weld code.
+    """
+    if isinstance(value, Expr):
+        return emit(value)
+    return str(value)
+
+
+class Raw(Expr):
+    """
+    Verbatim Weld code, e.g. the name of a WeldObject input or object.
+    """
+    _fields = ("code",)
+
+    def _to_str(self, emit):
+        return self.code
+
+
+class Literal(Expr):
+    """
+    A scalar literal `value` of the scalar WeldType `ty`.
+    """
+    _fields = ("value", "ty")
+
+    def __init__(self, value, ty):
+        Expr.__init__(self, value, str(ty))
+
+    def _to_str(self, emit):
+        return literal(self.value, self.ty)
+
+
+def literal(value, ty):
+    """
+    Returns the Weld code of the scalar `value` as a literal of type `ty`.
+    """
+    ty = str(ty)
+    if ty == "bool":
+        return "true" if value else "false"
+    elif ty in ("i8", "i32", "i64"):
+        if int(value) != value:
+            raise ValueError("{} is not a literal of type {}".format(value, ty))
+        value = int(value)
+        bits = {"i8": 8, "i32": 32, "i64": 64}[ty]
+        suffix = {"i8": "c", "i32": "", "i64": "L"}[ty]
+        if not -(1 << (bits - 1)) <= value < (1 << (bits - 1)):
+            raise ValueError("{} is out of the range of {}".format(value, ty))
+        if value == -(1 << (bits - 1)):
+            # The magnitude of the minimum value does not fit in the type, so
+            # Weld can't parse it as a literal.
+            return "((-%d%s) - 1%s)" % (-value - 1, suffix, suffix)
+        code = "%d%s" % (abs(value), suffix)
+    elif ty in ("f32", "f64"):
+        value = float(value)
+        if value != value or value in (float("inf"), float("-inf")):
+            raise ValueError("Weld has no literal for {}".format(value))
+        # Weld's float literals need a fractional part, and their exponents
+        # can't have a '+' sign.
+        mantissa, _, exponent = repr(abs(value)).partition("e")
+        if "." not in mantissa:
+            mantissa += ".0"
+        code = mantissa
+        if exponent:
+            code += "e" + exponent.lstrip("+")
+        if ty == "f32":
+            code += "F"
+    else:
+        raise ValueError("unsupported literal type {}".format(ty))
+    if value < 0:
+        return "(-%s)" % code
+    return code
+
+
+class Param(Expr):
+    """
+    A parameter of a Lambda.
+    """
+    _fields = ("name", "ty")
+
+    def __init__(self, name, ty=None):
+        Expr.__init__(self, name, None if ty is None else str(ty))
+
+    def _free_params(self):
+        return frozenset([self.name])
+
+    def _to_str(self, emit):
+        return self.name
+
+
+class Lambda(Expr):
+    """
+    A function with the Param nodes `params`, e.g. the update function of a
+    For.
+    """
+    _fields = ("params", "body")
+
+    def __init__(self, params, body):
+        Expr.__init__(self, tuple(params), body)
+
+    def _free_params(self):
+        bound = set(p.name for p in self.params)
+        return frozenset(self.body._free - bound)
+
+    def _to_str(self, emit):
+        params = ", ".join(
+            p.name if p.ty is None else "%s: %s" % (p.name, p.ty)
+            for p in self.params)
+        return "|%s| %s" % (params, _code(self.body, emit))
+
+
+class BinOp(Expr):
+    """
+    A binary operator, e.g. `+` or `<`.
+    """
+    _fields = ("op", "left", "right")
+
+    def _to_str(self, emit):
+        return "(%s %s %s)" % (_code(self.left, emit), self.op,
+                               _code(self.right, emit))
+
+
+class UnaryOp(Expr):
+    """
+    A unary operator, e.g. `-`.
+    """
+    _fields = ("op", "value")
+
+    def _to_str(self, emit):
+        return "(%s%s)" % (self.op, _code(self.value, emit))
+
+
+class Call(Expr):
+    """
+    A call to a builtin function, e.g. `exp`, `sqrt`, `min` or `pow`.
+    """
+    _fields = ("func", "args")
+
+    def __init__(self, func, args):
+        Expr.__init__(self, func, tuple(args))
+
+    def _to_str(self, emit):
+        return "%s(%s)" % (self.func,
+                           ", ".join(_code(a, emit) for a in self.args))
+
+
+class Cast(Expr):
+    """
+    A conversion of `value` to the scalar type `ty`.
+    """
+    _fields = ("ty", "value")
+
+    def __init__(self, ty, value):
+        Expr.__init__(self, str(ty), value)
+
+    def _to_str(self, emit):
+        return "%s(%s)" % (self.ty, _code(self.value, emit))
+
+
+class If(Expr):
+    _fields = ("cond", "on_true", "on_false")
+
+    def _to_str(self, emit):
+        return "if(%s, %s, %s)" % (_code(self.cond, emit),
+                                   _code(self.on_true, emit),
+                                   _code(self.on_false, emit))
+
+
+class Let(Expr):
+    """
+    Binds `value` to `name` in `body`.
+    """
+    _fields = ("name", "value", "body")
+
+    def _to_str(self, emit):
+        return "(let %s = %s; %s)" % (self.name, _code(self.value, emit),
+                                      _code(self.body, emit))
+
+
+class Lookup(Expr):
+    _fields = ("data", "index")
+
+    def _to_str(self, emit):
+        return "lookup(%s, %s)" % (_code(self.data, emit),
+                                   _code(self.index, emit))
+
+
+class Len(Expr):
+    _fields = ("data",)
+
+    def _to_str(self, emit):
+        return "len(%s)" % _code(self.data, emit)
+
+
+class GetField(Expr):
+    """
+    The field `index` of the struct `value`.
+    """
+    _fields = ("value", "index")
+
+    def _to_str(self, emit):
+        return "%s.$%d" % (_code(self.value, emit), self.index)
+
+
+class MakeStruct(Expr):
+    _fields = ("items",)
+
+    def __init__(self, items):
+        Expr.__init__(self, tuple(items))
+
+    def _to_str(self, emit):
+        return "{%s}" % ", ".join(_code(i, emit) for i in self.items)
+
+
+class MakeVector(Expr):
+    _fields = ("items",)
+
+    def __init__(self, items):
+        Expr.__init__(self, tuple(items))
+
+    def _to_str(self, emit):
+        return "[%s]" % ", ".join(_code(i, emit) for i in self.items)
+
+
+class Iter(Expr):
+    """
+    Iterates over `data` from `start` to `end` with `stride`.
+    """
+    _fields = ("data", "start", "end", "stride")
+
+    def _to_str(self, emit):
+        return "iter(%s, %s, %s, %s)" % tuple(
+            _code(getattr(self, f), emit) for f in self._fields)
+
+
+class NdIter(Expr):
+    """
+    Iterates over the elements of an n-dimensional view of `data`.
+    """
+    _fields = ("data", "start", "end", "stride", "shape", "strides")
+
+    def _to_str(self, emit):
+        return "nditer(%s, %s, %s, %s, %s, %s)" % tuple(
+            _code(getattr(self, f), emit) for f in self._fields)
+
+
+class Zip(Expr):
+    _fields = ("data",)
+
+    def __init__(self, data):
+        Expr.__init__(self, tuple(data))
+
+    def _to_str(self, emit):
+        return "zip(%s)" % ", ".join(_code(d, emit) for d in self.data)
+
+
+class Appender(Expr):
+    """
+    A new appender, of element type `ty` if it is given.
+    """
+    _fields = ("ty",)
+    is_builder = True
+
+    def __init__(self, ty=None):
+        Expr.__init__(self, None if ty is None else str(ty))
+
+    def _to_str(self, emit):
+        if self.ty is None:
+            return "appender"
+        return "appender[%s]" % self.ty
+
+
+class Merger(Expr):
+    _fields = ("ty", "op")
+    is_builder = True
+
+    def __init__(self, ty, op):
+        Expr.__init__(self, str(ty), op)
+
+    def _to_str(self, emit):
+        return "merger[%s, %s]" % (self.ty, self.op)
+
+
+class VecMerger(Expr):
+    """
+    A new vecmerger, merging {index, value} pairs into a copy of `init`.
+    """
+    _fields = ("ty", "op", "init")
+    is_builder = True
+
+    def __init__(self, ty, op, init):
+        Expr.__init__(self, str(ty), op, init)
+
+    def _to_str(self, emit):
+        return "vecmerger[%s, %s](%s)" % (self.ty, self.op,
+                                          _code(self.init, emit))
+
+
+class DictMerger(Expr):
+    _fields = ("key_ty", "value_ty", "op")
+    is_builder = True
+
+    def __init__(self, key_ty, value_ty, op):
+        Expr.__init__(self, str(key_ty), str(value_ty), op)
+
+    def _to_str(self, emit):
+        return "dictmerger[%s, %s, %s]" % (self.key_ty, self.value_ty,
+                                           self.op)
+
+
+class For(Expr):
+    """
+    Merges into `builder` by applying `func`, a Lambda of (builder, index,
+    element), to each element of `data`.
+    """
+    _fields = ("data", "builder", "func")
+    is_builder = True
+
+    def _to_str(self, emit):
+        return "for(%s, %s, %s)" % (_code(self.data, emit),
+                                    _code(self.builder, emit),
+                                    _code(self.func, emit))
+
+
+class Merge(Expr):
+    _fields = ("builder", "value")
+    is_builder = True
+
+    def _to_str(self, emit):
+        return "merge(%s, %s)" % (_code(self.builder, emit),
+                                  _code(self.value, emit))
+
+
+class Result(Expr):
+    _fields = ("builder",)
+
+    def _to_str(self, emit):
+        return "result(%s)" % _code(self.builder, emit)
+
+
+class ToVec(Expr):
+    _fields = ("data",)
+
+    def _to_str(self, emit):
+        return "tovec(%s)" % _code(self.data, emit)
+
+
+def map_vec(data, func):
+    """
+    Returns the expression applying `func`, a function from an element
+    expression to an expression, to each element of `data`.
+    """
+    b, i, e = Param("b"), Param("i"), Param("e")
+    return Result(For(data, Appender(), Lambda([b, i, e],
+                                               Merge(b, func(e)))))
+
+
+def _bindable(expr):
+    """
+    Returns whether a shared `expr` can be bound to a let at the top of the
+    program. Lambdas can't be, since Weld does not parse them as let values.
+    """
+    return not (expr.is_builder or
+                isinstance(expr, (Raw, Literal, Param, Lambda)) or
+                expr.free_params())
+
+
+def serialize(expr):
+    """
+    Returns the Weld code of `expr`. Expressions which are used more than
+    once (by identity) and don't depend on lambda parameters are computed
+    once, in a let at the start of the code.
+    """
+    # Count the uses of each node, and list the nodes in post-order, so
+    # that every node comes after the nodes it uses.
+    uses = {}
+    order = _postorder(expr, uses=uses)
+
+    # The code of each node is built from the codes of its children, which
+    # are dropped once all their uses have been emitted.
+    codes = {}
+    remaining = dict(uses)
+
+    def emit(node):
+        code = codes[id(node)]
+        remaining[id(node)] -= 1
+        if remaining[id(node)] == 0:
+            del codes[id(node)]
+        return code
+
+    lets = []
+    for node in order:
+        code = node._to_str(emit)
+        if node is not expr and uses[id(node)] > 1 and _bindable(node):
+            name = "_e%d" % len(lets)
+            lets.append("let %s = %s;" % (name, code))
+            code = name
+        codes[id(node)] = code
+
+    body = codes[id(expr)]
+    if not lets:
+        return body
+    return "(%s %s)" % (" ".join(lets), body)
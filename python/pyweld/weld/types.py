@@ -5,14 +5,54 @@
 #
 #
 
+import threading
+
 from ctypes import *
 
+# Guards the creation of ctypes classes, which must be unique per type.
+_ctype_lock = threading.RLock()
+
 
 class WeldType(object):
     """Summary
+
+    Weld types are interned and immutable: constructing a type equal to an
+    existing one returns the existing object. Types therefore compare by
+    identity, and their string form, hash and ctypes class are computed once.
     """
+    __slots__ = ["_args", "_str", "_hash", "_ctype_class"]
 
-    def __str__(self):
+    # Maps (class, constructor arguments) -> the type object
+    _interned = {}
+
+    def __new__(cls, *args):
+        """Summary
+
+        Args:
+            *args: Arguments identifying the type
+
+        Returns:
+            TYPE: The interned type
+        """
+        key = (cls,) + args
+        self = WeldType._interned.get(key)
+        if self is None:
+            self = object.__new__(cls)
+            self._args = args
+            self._ctype_class = None
+            self._init(*args)
+            self._str = self._to_str()
+            self._hash = hash(self._str)
+            # Another thread may have interned the same type meanwhile.
+            self = WeldType._interned.setdefault(key, self)
+        return self
+
+    def _init(self):
+        """Summary
+        """
+        pass
+
+    def _to_str(self):
         """Summary
 
         Returns:
@@ -20,14 +60,24 @@ class WeldType(object):
         """
         return "type"
 
-    def __hash__(self):
+    def __str__(self):
         """Summary
 
         Returns:
             TYPE: Description
         """
+        return self._str
+
+    def __repr__(self):
+        return self._str
 
-        return hash(str(self))
+    def __hash__(self):
+        """Summary
+
+        Returns:
+            TYPE: Description
+        """
+        return self._hash
 
     def __eq__(self, other):
         """Summary
@@ -38,13 +88,32 @@ class WeldType(object):
         Returns:
             TYPE: Description
         """
-        return hash(other) == hash(self)
+        return self is other
+
+    def __ne__(self, other):
+        return self is not other
+
+    def __reduce__(self):
+        return (self.__class__, self._args)
 
     @property
     def ctype_class(self):
         """
         Returns a class representing this type's ctype representation.
 
+        ctypes requires the same class to be used for the same type, so it is
+        created once and memoized.
+        """
+        if self._ctype_class is None:
+            with _ctype_lock:
+                if self._ctype_class is None:
+                    self._ctype_class = self._make_ctype_class()
+        return self._ctype_class
+
+    def _make_ctype_class(self):
+        """
+        Returns a new class representing this type's ctype representation.
+
         Raises:
             NotImplementedError: Description
         """
@@ -54,8 +123,9 @@ class WeldType(object):
 class WeldChar(WeldType):
     """Summary
     """
+    __slots__ = []
 
-    def __str__(self):
+    def _to_str(self):
         """Summary
 
         Returns:
@@ -63,8 +133,7 @@ class WeldChar(WeldType):
         """
         return "i8"
 
-    @property
-    def ctype_class(self):
+    def _make_ctype_class(self):
         """Summary
 
         Returns:
@@ -76,8 +145,9 @@ class WeldChar(WeldType):
 class WeldBit(WeldType):
     """Summary
     """
+    __slots__ = []
 
-    def __str__(self):
+    def _to_str(self):
         """Summary
 
         Returns:
@@ -85,8 +155,7 @@ class WeldBit(WeldType):
         """
         return "bool"
 
-    @property
-    def ctype_class(self):
+    def _make_ctype_class(self):
         """Summary
 
         Returns:
@@ -98,8 +167,9 @@ class WeldBit(WeldType):
 class WeldInt(WeldType):
     """Summary
     """
+    __slots__ = []
 
-    def __str__(self):
+    def _to_str(self):
         """Summary
 
         Returns:
@@ -107,8 +177,7 @@ class WeldInt(WeldType):
         """
         return "i32"
 
-    @property
-    def ctype_class(self):
+    def _make_ctype_class(self):
         """Summary
 
         Returns:
@@ -120,8 +189,9 @@ class WeldInt(WeldType):
 class WeldLong(WeldType):
     """Summary
     """
+    __slots__ = []
 
-    def __str__(self):
+    def _to_str(self):
         """Summary
 
         Returns:
@@ -129,8 +199,7 @@ class WeldLong(WeldType):
         """
         return "i64"
 
-    @property
-    def ctype_class(self):
+    def _make_ctype_class(self):
         """Summary
 
         Returns:
@@ -142,8 +211,9 @@ class WeldLong(WeldType):
 class WeldFloat(WeldType):
     """Summary
     """
+    __slots__ = []
 
-    def __str__(self):
+    def _to_str(self):
         """Summary
 
         Returns:
@@ -151,16 +221,16 @@ class WeldFloat(WeldType):
         """
         return "f32"
 
-    @property
-    def ctype_class(self):
+    def _make_ctype_class(self):
         return c_float
 
 
 class WeldDouble(WeldType):
     """Summary
     """
+    __slots__ = []
 
-    def __str__(self):
+    def _to_str(self):
         """Summary
 
         Returns:
@@ -168,8 +238,7 @@ class WeldDouble(WeldType):
         """
         return "f64"
 
-    @property
-    def ctype_class(self):
+    def _make_ctype_class(self):
         """Summary
 
         Returns:
@@ -184,12 +253,9 @@ class WeldVec(WeldType):
     Attributes:
         elemType (TYPE): Description
     """
-    # Kind of a hack, but ctypes requires that the class instance returned is
-    # the same object. Every time we create a new Vec instance (templatized by
-    # type), we cache it here.
-    _singletons = {}
+    __slots__ = ["elemType"]
 
-    def __init__(self, elemType):
+    def _init(self, elemType):
         """Summary
 
         Args:
@@ -197,7 +263,7 @@ class WeldVec(WeldType):
         """
         self.elemType = elemType
 
-    def __str__(self):
+    def _to_str(self):
         """Summary
 
         Returns:
@@ -205,34 +271,22 @@ class WeldVec(WeldType):
         """
         return "vec[%s]" % str(self.elemType)
 
-    @property
-    def ctype_class(self):
+    def _make_ctype_class(self):
         """Summary
 
         Returns:
             TYPE: Description
         """
-        def vec_factory(elemType):
-            """Summary
+        elemType = self.elemType
 
-            Args:
-                elemType (TYPE): Description
-
-            Returns:
-                TYPE: Description
+        class Vec(Structure):
+            """Summary
             """
-            class Vec(Structure):
-                """Summary
-                """
-                _fields_ = [
-                    ("ptr", POINTER(elemType.ctype_class)),
-                    ("size", c_long),
-                ]
-            return Vec
-
-        if self.elemType not in WeldVec._singletons:
-            WeldVec._singletons[self.elemType] = vec_factory(self.elemType)
-        return WeldVec._singletons[self.elemType]
+            _fields_ = [
+                ("ptr", POINTER(elemType.ctype_class)),
+                ("size", c_long),
+            ]
+        return Vec
 
 
 class WeldStruct(WeldType):
@@ -241,9 +295,20 @@ class WeldStruct(WeldType):
     Attributes:
         field_types (TYPE): Description
     """
-    _singletons = {}
+    __slots__ = ["field_types"]
 
-    def __init__(self, field_types):
+    def __new__(cls, field_types):
+        """Summary
+
+        Args:
+            field_types (TYPE): Description
+
+        Returns:
+            TYPE: The interned type
+        """
+        return WeldType.__new__(cls, tuple(field_types))
+
+    def _init(self, field_types):
         """Summary
 
         Args:
@@ -252,7 +317,7 @@ class WeldStruct(WeldType):
         assert False not in [isinstance(e, WeldType) for e in field_types]
         self.field_types = field_types
 
-    def __str__(self):
+    def _to_str(self):
         """Summary
 
         Returns:
@@ -260,30 +325,17 @@ class WeldStruct(WeldType):
         """
         return "{" + ",".join([str(f) for f in self.field_types]) + "}"
 
-    @property
-    def ctype_class(self):
+    def _make_ctype_class(self):
         """Summary
 
         Returns:
             TYPE: Description
         """
-        def struct_factory(field_types):
-            """Summary
+        field_types = self.field_types
 
-            Args:
-                field_types (TYPE): Description
-
-            Returns:
-                TYPE: Description
+        class Struct(Structure):
+            """Summary
             """
-            class Struct(Structure):
-                """Summary
-                """
-                _fields_ = [(str(i), t.ctype_class)
-                            for i, t in enumerate(field_types)]
-            return Struct
-
-        if frozenset(self.field_types) not in WeldVec._singletons:
-            WeldStruct._singletons[
-                frozenset(self.field_types)] = struct_factory(self.field_types)
-        return WeldStruct._singletons[frozenset(self.field_types)]
+            _fields_ = [(str(i), t.ctype_class)
+                        for i, t in enumerate(field_types)]
+        return Struct
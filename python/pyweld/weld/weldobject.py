@@ -5,13 +5,31 @@
 #
 
 import ctypes
+import itertools
+import multiprocessing
 import os
 import time
 import re
+import threading
+import weakref
 
 import bindings as cweld
+import cache
+import ir
 from types import *
 
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    # Python 2 requires the `futures` backport for asynchronous evaluation.
+    ThreadPoolExecutor = None
+
+try:
+    import asyncio
+except ImportError:
+    # asyncio requires Python 3.4+.
+    asyncio = None
+
 
 class WeldObjectEncoder(object):
     """
@@ -36,8 +54,19 @@ class WeldObjectDecoder(object):
     """
     An abstract class that must be overwridden by libraries. This class
     is used to marshall objects from Weld types to Python types.
+
+    Decoders which set `takes_ownership` are passed the ResultOwner of the
+    value being decoded as the `owner` keyword argument, and must keep a
+    reference to it from every decoded object which points into the value
+    (e.g., as the base of a NumPy array). The value is then freed once the
+    owner is garbage collected. Values decoded by other decoders are never
+    freed, since the decoded objects may point into them. Scalar results are
+    always copied by decoders, so they are decoded without an owner and freed
+    right away.
     """
-    def decode(obj, restype):
+    takes_ownership = False
+
+    def decode(obj, restype, owner=None):
         """
         Decodes obj, assuming object is of type `restype`. obj's Python
         type is ctypes.POINTER(restype.ctype_class).
@@ -45,6 +74,30 @@ class WeldObjectDecoder(object):
         raise NotImplementedError
 
 
+class ResultOwner(object):
+    """
+    Owns the WeldValue returned by running a module, and frees it, along with
+    the memory allocated by the run, once garbage collected.
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+    def __del__(self):
+        self.value.free()
+
+
+def _unregister_input(key, ref):
+    """
+    Removes the registry entry for `key` once the input it was created for
+    (referenced by `ref`) has been freed.
+    """
+    with WeldObject._registry_lock:
+        entry = WeldObject._registry.get(key)
+        if entry is not None and entry[1] is ref:
+            del WeldObject._registry[key]
+
+
 class WeldObject(object):
     """
     Holds a Weld program to be lazily compiled and evaluated,
@@ -72,31 +125,37 @@ class WeldObject(object):
     6. Return the decoded value.
     """
 
-    # Counter for assigning variable names
-    _var_num = 0
-    _obj_id = 100
+    # Counters for assigning variable names and object IDs. Drawing from an
+    # itertools.count is atomic, so objects may be built from several threads.
+    _var_nums = itertools.count(0)
+    _obj_ids = itertools.count(100)
+    # Maps the key of an input (see _input_name) -> (name, weak reference)
     _registry = {}
+    # Reentrant, since a weak reference callback may fire (and unregister an
+    # input) while the registry is locked on the same thread.
+    _registry_lock = threading.RLock()
 
     def __init__(self, encoder, decoder):
         self.encoder = encoder
         self.decoder = decoder
 
-        # Weld program
+        # Weld program: a string of Weld code, or a weld.ir expression
         self.weld_code = ""
         self.inplace_weld_code = None
         self.dependencies = {}
 
         # Assign a unique ID to the context
-        self.obj_id = "obj%d" % WeldObject._obj_id
-        WeldObject._obj_id += 1
+        self.obj_id = "obj%d" % next(WeldObject._obj_ids)
 
         # Maps name -> input data
         self.context = {}
         # Maps name -> arg type (for arguments that don't need to be encoded)
         self.argtypes = {}
+        # EvaluationMetrics of the last evaluation of this object
+        self.metrics = None
 
     def __repr__(self):
-        return self.weld_code + " " + str(self.context) + " " + str([obj_id for obj_id in self.dependencies])
+        return str(self.weld_code) + " " + str(self.context) + " " + str([obj_id for obj_id in self.dependencies])
 
     def update(self, value, tys=None, override=True):
         """
@@ -108,71 +167,142 @@ class WeldObject(object):
         """
         if isinstance(value, WeldObject):
             self.context.update(value.context)
+            # types of the arguments which are not encoded, e.g. hoisted
+            # literals.
+            self.argtypes.update(value.argtypes)
         else:
             # Ensure that the same inputs always have same names
-            value_str = str(value)
-            if value_str in WeldObject._registry:
-                name = WeldObject._registry[value_str]
-            else:
-                name = "_inp%d" % WeldObject._var_num
-                WeldObject._var_num += 1
-                WeldObject._registry[value_str] = name
+            name = WeldObject._input_name(value)
             self.context[name] = value
             if tys is not None and not override:
                 self.argtypes[name] = tys
             return name
 
+    def literal(self, value, ty):
+        """
+        Returns Weld code for the scalar `value`, of Weld type `ty`.
+
+        If literal hoisting is enabled (see set_hoist_literals), the value is
+        added as an argument of the program and its name is returned, so that
+        programs which only differ in their constants share a compiled module.
+        Otherwise, the value is written into the code as a literal.
+        """
+        if not _hoist_literals:
+            return ir.literal(value, ty)
+        if isinstance(ty, (WeldFloat, WeldDouble)):
+            value = float(value)
+        elif isinstance(ty, WeldBit):
+            value = bool(value)
+        else:
+            value = int(value)
+        return self.update(value, ty, override=False)
+
+    @staticmethod
+    def _input_name(value):
+        """
+        Returns the name of the input `value`. Arrays are identified by their
+        buffer (address, shape, type and strides) and other objects by their
+        identity, so registering an input costs the same regardless of its
+        size. The registry only holds weak references, so a name is released
+        once its input has been freed.
+        """
+        interface = getattr(value, "__array_interface__", None)
+        if interface is not None:
+            key = (interface["data"][0], interface["shape"],
+                   interface["typestr"], interface["strides"])
+        else:
+            key = id(value)
+
+        with WeldObject._registry_lock:
+            entry = WeldObject._registry.get(key)
+            if entry is not None and entry[1]() is not None:
+                return entry[0]
+
+            name = "_inp%d" % next(WeldObject._var_nums)
+            try:
+                ref = weakref.ref(
+                    value, lambda ref: _unregister_input(key, ref))
+            except TypeError:
+                # Values such as Python strings and numbers can't be weakly
+                # referenced; these just get a fresh name every time.
+                return name
+            WeldObject._registry[key] = (name, ref)
+            return name
+
     def get_let_statements(self):
-        queue = [self]
-        visited = set()
+        """
+        Returns the let statements defining the objects this object depends
+        on, ordered so that each object is defined after its dependencies.
+        """
+        return "\n".join(self._let_statements()[0])
+
+    def _let_statements(self):
+        """
+        Returns the list of let statements defining the objects this object
+        depends on, and a dictionary mapping the IDs of objects which were not
+        defined to the IDs of identical objects which were.
+
+        The dependency graph is sorted topologically with an iterative
+        depth-first search, which visits each object and edge once. Objects
+        whose code is the same once the IDs of their dependencies are
+        replaced by those of their representatives (i.e., which compute the
+        same expression on the same inputs) are only defined once.
+        """
+        def dependencies(obj):
+            return iter([obj.dependencies[key]
+                         for key in sorted(obj.dependencies)])
+
         let_statements = []
-        is_first = True
-        while len(queue) > 0:
-            cur_obj = queue.pop()
-            cur_obj_id = cur_obj.obj_id
-            if cur_obj_id in visited:
-                continue
-            if not is_first:
-                let_statements.insert(0, "let %s = (%s);" % (cur_obj_id, cur_obj.weld_code))
-            is_first = False
-            for key in sorted(cur_obj.dependencies.keys()):
-                queue.append(cur_obj.dependencies[key])
-            visited.add(cur_obj_id)
-        # each let statement is of the form:
-        #   let obj10xx = ....;
-        # we must sort the object by their numerical values of obj, otherwise
-        # in a case with: obj100, and obj99, obj100 < obj99 according to string
-        # sorting rules
-        let_statements.sort(key=lambda x: int(re.search(r'\d+', x).group()))
-        return "\n".join(let_statements)
+        # Maps the code of each defined object -> its ID
+        defined = {}
+        # Maps the ID of each duplicate object -> the ID of the defined one
+        renames = {}
+        visited = set([self.obj_id])
+        stack = [(self, dependencies(self))]
+        while stack:
+            cur_obj, deps = stack[-1]
+            for dep in deps:
+                if dep.obj_id not in visited:
+                    visited.add(dep.obj_id)
+                    stack.append((dep, dependencies(dep)))
+                    break
+            else:
+                # All of cur_obj's dependencies have been emitted.
+                stack.pop()
+                if cur_obj is not self:
+                    code = _rename_objects(str(cur_obj.weld_code), renames)
+                    obj_id = defined.setdefault(code, cur_obj.obj_id)
+                    if obj_id != cur_obj.obj_id:
+                        renames[cur_obj.obj_id] = obj_id
+                    else:
+                        let_statements.append(
+                            "let %s = (%s);" % (obj_id, code))
+        return let_statements, renames
 
     def to_weld_func(self):
         names = self.context.keys()
         names.sort()
-        arg_strs = ["{0}: {1}".format(str(name),
-                                      str(self.encoder.py_to_weld_type(self.context[name])))
+        arg_strs = ["{0}: {1}".format(str(name), str(self._arg_type(name)))
                     for name in names]
         header = "|" + ", ".join(arg_strs) + "|"
-        keys = self.dependencies.keys()
-        keys.sort()
-        text = header + " " + self.get_let_statements() + "\n" + self.weld_code
+        let_statements, renames = self._let_statements()
+        code = _rename_objects(str(self.weld_code), renames)
+        text = header + " " + "\n".join(let_statements) + "\n" + code
         return text
 
-    def evaluate(self, restype, verbose=True, decode=True, passes=None):
-        function = self.to_weld_func()
-
-        # Returns a wrapped ctypes Structure
-        def args_factory(encoded):
-            class Args(ctypes.Structure):
-                _fields_ = [e for e in encoded]
-            return Args
-
-        # Encode each input argument. This is the positional argument list
-        # which will be wrapped into a Weld struct and passed to the Weld API.
-        names = self.context.keys()
-        names.sort()
+    def _arg_type(self, name):
+        """
+        Returns the Weld type of the input `name`.
+        """
+        if name in self.argtypes:
+            return self.argtypes[name]
+        return self.encoder.py_to_weld_type(self.context[name])
 
-        start = time.time()
+    def _encode_args(self, names):
+        """
+        Encodes the inputs `names`, returning the list of their ctypes classes
+        and the list of their encoded values.
+        """
         encoded = []
         argtypes = []
         for name in names:
@@ -183,62 +313,489 @@ class WeldObject(object):
                 argtypes.append(self.encoder.py_to_weld_type(
                     self.context[name]).ctype_class)
                 encoded.append(self.encoder.encode(self.context[name]))
-        end = time.time()
-        if verbose:
-            print "Python->Weld:", end - start
+        return argtypes, encoded
 
-        start = time.time()
-        Args = args_factory(zip(names, argtypes))
-        weld_args = Args()
-        for name, value in zip(names, encoded):
-            setattr(weld_args, name, value)
+    def compile(self, restype, passes=None):
+        """
+        Compiles this object into a CompiledWeldObject, which evaluates the
+        same computation on new inputs without building, compiling or
+        type-checking the program again.
+        """
+        return CompiledWeldObject(self, restype, passes)
 
-        start = time.time()
-        void_ptr = ctypes.cast(ctypes.byref(weld_args), ctypes.c_void_p)
-        arg = cweld.WeldValue(void_ptr)
-        conf = cweld.WeldConf()
-        err = cweld.WeldError()
-
-        if passes is not None:
-            conf.set("weld.optimization.passes", ",".join(passes))
-        # conf.set("weld.compile.dumpCode", "true")
-        # conf.set("weld.compile.multithreadSupport", "false")
-        module = cweld.WeldModule(function, conf, err)
-        if err.code() != 0:
-            raise ValueError("Could not compile function {}: {}".format(
-                function, err.message()))
-        end = time.time()
-        if verbose:
-            print "Weld compile time:", end - start
+    def evaluate(self, restype, verbose=False, decode=True, passes=None,
+                 num_threads=None):
+        """
+        Evaluates the object and returns its result, of Weld type `restype`.
+        The module is run with `num_threads` threads (see run_conf).
 
-        start = time.time()
-        conf = cweld.WeldConf()
-        weld_num_threads = os.environ.get("WELD_NUM_THREADS", "1")
-        conf.set("weld.threads", weld_num_threads)
-	mem_limit = "1000000000000"
-        conf.set("weld.memory.limit", mem_limit)
-
-        err = cweld.WeldError()
-        weld_ret = module.run(conf, arg, err)
-        if err.code() != 0:
-            raise ValueError(("Error while running function,\n{}\n\n"
-                              "Error message: {}").format(
-                function, err.message()))
-        ptrtype = POINTER(restype.ctype_class)
-        data = ctypes.cast(weld_ret.data(), ptrtype)
-        end = time.time()
-        if verbose:
-            print "Weld:", end - start
+        The measurements of the evaluation are stored in the `metrics` field
+        as an EvaluationMetrics, and passed to the callback registered with
+        set_metrics_callback. If `verbose` is True, they are also printed.
+        """
+        metrics = EvaluationMetrics()
+        function, names, weld_args = _assemble(self, metrics)
+        # Programs which only differ in the names of their inputs share a
+        # compiled module, so repeated evaluations of the same computation on
+        # new data skip compilation.
+        module = _compile(function, passes, metrics)
+        result = _run(module, run_conf(num_threads), weld_args, function,
+                      self.decoder, restype, metrics, decode)
+        self.metrics = metrics
+        _report_metrics(metrics, verbose)
+        return result
+
+    def evaluate_async(self, restype, passes=None, executor=None):
+        """
+        Evaluates the object on a thread pool, and returns a
+        concurrent.futures.Future holding the result.
+
+        The inputs are encoded before this method returns, so the caller may
+        go on building or encoding other objects while the module is compiled
+        and run on the pool. libweld is called with the GIL released. Uses the
+        shared pool returned by get_executor() unless `executor` is given.
+        The metrics of the evaluation are stored and reported as by evaluate,
+        from the pool's thread, before the future completes.
+        """
+        if executor is None:
+            executor = get_executor()
+        metrics = EvaluationMetrics()
+        function, names, weld_args = _assemble(self, metrics)
+        # The encoded arguments point into the inputs, which must stay alive
+        # until the module has run.
+        inputs = [self.context[name] for name in names]
+        decoder = self.decoder
+
+        def run():
+            module = _compile(function, passes, metrics)
+            result = _run(module, run_conf(), weld_args, function, decoder,
+                          restype, metrics)
+            del inputs[:]
+            self.metrics = metrics
+            _report_metrics(metrics, False)
+            return result
+
+        return executor.submit(run)
+
+    def evaluate_awaitable(self, restype, passes=None, executor=None,
+                           loop=None):
+        """
+        Like evaluate_async, but returns an asyncio future which can be
+        awaited in the event loop `loop` (the current event loop by default).
+        Requires asyncio, which is not available on Python 2.
+        """
+        if asyncio is None:
+            raise NotImplementedError(
+                "evaluate_awaitable requires asyncio (Python 3.4+)")
+        future = self.evaluate_async(restype, passes, executor)
+        return asyncio.wrap_future(future, loop=loop)
 
-        start = time.time()
-        if decode:
-            result = self.decoder.decode(data, restype)
-        else:
-            data = cweld.WeldValue(weld_ret).data()
-            result = ctypes.cast(data, ctypes.POINTER(
-                ctypes.c_int64)).contents.value
-        end = time.time()
-        if verbose:
-            print "Weld->Python:", end - start
 
+class CompiledWeldObject(object):
+    """
+    A WeldObject whose program has been compiled, which can be called
+    repeatedly with new inputs.
+
+    Inputs are passed either positionally, in the order given by `names` (the
+    sorted names of the WeldObject's context), or by name; inputs which are not
+    passed keep the value they had in the WeldObject. New inputs must have the
+    same Weld types as the ones they replace, but arrays may have any size.
+    """
+
+    def __init__(self, obj, restype, passes=None):
+        self.encoder = obj.encoder
+        self.decoder = obj.decoder
+        self.restype = restype
+        self.function = obj.to_weld_func()
+        self.module = cache.get_module(self.function, passes)
+
+        self.names = sorted(obj.context.keys())
+        self.defaults = [obj.context[name] for name in self.names]
+        # The encoding plan: the Weld type of each input, and whether it must
+        # be encoded or is passed to Weld as is.
+        self.types = []
+        self.encode_args = []
+        for name in self.names:
+            if name in obj.argtypes:
+                self.types.append(obj.argtypes[name])
+                self.encode_args.append(False)
+            else:
+                self.types.append(
+                    self.encoder.py_to_weld_type(obj.context[name]))
+                self.encode_args.append(True)
+        self.Args = args_factory([ty.ctype_class for ty in self.types])
+        self._positions = dict((name, i) for i, name in enumerate(self.names))
+        self._conf = run_conf()
+        self._num_let_statements = len(_LET_RE.findall(self.function))
+        # EvaluationMetrics of the last call
+        self.metrics = None
+
+    def __call__(self, *inputs, **named_inputs):
+        if len(inputs) > len(self.names):
+            raise TypeError("expected at most {} inputs, got {}".format(
+                len(self.names), len(inputs)))
+        values = list(inputs) + self.defaults[len(inputs):]
+        for name, value in named_inputs.items():
+            if name not in self._positions:
+                raise TypeError("unknown input {}".format(name))
+            values[self._positions[name]] = value
+
+        # The program is neither assembled nor compiled again, so only the
+        # encoding, running and decoding are measured.
+        metrics = EvaluationMetrics()
+        metrics.program_size = len(self.function)
+        metrics.num_let_statements = self._num_let_statements
+        start = time.time()
+        encoded = []
+        for value, ty, encode in zip(values, self.types, self.encode_args):
+            if encode:
+                value_ty = self.encoder.py_to_weld_type(value)
+                if value_ty != ty:
+                    raise ValueError("expected an input of Weld type {}, "
+                                     "got {}".format(ty, value_ty))
+                value = self.encoder.encode(value)
+            encoded.append(value)
+        weld_args = self.Args(*encoded)
+        metrics.encode_time = time.time() - start
+        metrics.input_bytes = sum(
+            _nbytes(value, ty.ctype_class)
+            for value, ty in zip(values, self.types))
+
+        result = _run(self.module, self._conf, weld_args, self.function,
+                      self.decoder, self.restype, metrics)
+        self.metrics = metrics
+        _report_metrics(metrics, False)
         return result
+
+
+def evaluate_many(objs, restypes, verbose=False, passes=None):
+    """
+    Evaluates the WeldObjects `objs` in a single Weld program, and returns the
+    list of their results. `restypes` lists the Weld type of each result.
+
+    The objects' graphs are merged, so inputs and objects they share are read
+    and computed once. Inputs are encoded with the encoder of the first object,
+    and each result is decoded with the decoder of its own object. The metrics
+    of the evaluation are reported as by WeldObject.evaluate, and stored in the
+    `metrics` field of each object.
+    """
+    if len(objs) != len(restypes):
+        raise ValueError("expected one result type per object")
+
+    metrics = EvaluationMetrics()
+    combined = WeldObject(objs[0].encoder, objs[0].decoder)
+    for obj in objs:
+        combined.update(obj)
+        combined.dependencies[obj.obj_id] = obj
+    # The program returns a struct with one field per object.
+    combined.weld_code = "{%s}" % ", ".join(obj.obj_id for obj in objs)
+    function, _, weld_args = _assemble(combined, metrics)
+    module = _compile(function, passes, metrics)
+    decoder = _FieldsDecoder([obj.decoder for obj in objs])
+    results = _run(module, run_conf(), weld_args, function, decoder,
+                   WeldStruct(restypes), metrics)
+    metrics.output_bytes = sum(
+        _nbytes(result, ty.ctype_class)
+        for result, ty in zip(results, restypes))
+
+    for obj in objs:
+        obj.metrics = metrics
+    _report_metrics(metrics, verbose)
+    return results
+
+
+class EvaluationMetrics(object):
+    """
+    Measurements of a single evaluation. Times are in seconds, and sizes in
+    bytes; the sizes of inputs and results are their `nbytes` if they have
+    one, and the size of their ctypes representation otherwise.
+    """
+
+    def __init__(self):
+        # Time spent generating the program from the object graph.
+        self.assembly_time = 0.0
+        self.encode_time = 0.0
+        self.compile_time = 0.0
+        self.run_time = 0.0
+        self.decode_time = 0.0
+        # Length of the program text, and number of let statements in it.
+        self.program_size = 0
+        self.num_let_statements = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+        # Memory allocated by Weld while running the module.
+        self.memory_usage = 0
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+    def __repr__(self):
+        return "EvaluationMetrics(%s)" % ", ".join(
+            "%s=%r" % item for item in sorted(self.__dict__.items()))
+
+    def __str__(self):
+        return "\n".join([
+            "Python->Weld: %s" % self.encode_time,
+            "Weld compile time: %s" % self.compile_time,
+            "Weld: %s" % self.run_time,
+            "Weld->Python: %s" % self.decode_time,
+        ])
+
+
+# Matches the IDs of WeldObjects in Weld code.
+_OBJ_ID_RE = re.compile(r'\bobj\d+\b')
+
+
+def _rename_objects(code, renames):
+    """
+    Replaces the object IDs in `code` which are keys of `renames` by their
+    values.
+    """
+    if not renames:
+        return code
+    return _OBJ_ID_RE.sub(
+        lambda match: renames.get(match.group(0), match.group(0)), code)
+
+
+# Matches the let statements generated by get_let_statements.
+_LET_RE = re.compile(r'\blet obj\d+ = \(')
+
+_metrics_callback = None
+
+_hoist_literals = os.environ.get("WELD_HOIST_LITERALS", "0") not in ("", "0")
+
+
+def set_hoist_literals(enabled):
+    """
+    Enables or disables passing the scalars created with WeldObject.literal
+    as program arguments instead of writing them into the code.
+    """
+    global _hoist_literals
+    _hoist_literals = bool(enabled)
+
+
+def set_metrics_callback(callback):
+    """
+    Registers `callback`, which is called with the EvaluationMetrics of every
+    evaluation, or removes the current callback if `callback` is None.
+    """
+    global _metrics_callback
+    _metrics_callback = callback
+
+
+def _assemble(obj, metrics):
+    """
+    Generates the program of `obj` and encodes its inputs, recording both
+    steps in `metrics`. Returns the program, the sorted names of the inputs
+    and the Weld arguments.
+    """
+    start = time.time()
+    function = obj.to_weld_func()
+    metrics.assembly_time = time.time() - start
+    metrics.program_size = len(function)
+    metrics.num_let_statements = len(_LET_RE.findall(function))
+
+    # Encode each input argument. This is the positional argument list
+    # which will be wrapped into a Weld struct and passed to the Weld API.
+    names = sorted(obj.context.keys())
+    start = time.time()
+    argtypes, encoded = obj._encode_args(names)
+    weld_args = args_factory(argtypes)(*encoded)
+    metrics.encode_time = time.time() - start
+    metrics.input_bytes = sum(
+        _nbytes(obj.context[name], argtype)
+        for name, argtype in zip(names, argtypes))
+    return function, names, weld_args
+
+
+def _compile(function, passes, metrics):
+    """
+    Returns a compiled module for `function`, recording the time it took in
+    `metrics`.
+    """
+    start = time.time()
+    module = cache.get_module(function, passes)
+    metrics.compile_time = time.time() - start
+    return module
+
+
+def _run(module, conf, weld_args, function, decoder, restype, metrics,
+         decode=True):
+    """
+    Runs `module` and decodes its result, of Weld type `restype`, recording
+    both steps in `metrics`. If `decode` is False, returns the raw 64-bit word
+    at the start of the result instead.
+    """
+    start = time.time()
+    weld_ret = run_module(module, conf, weld_args, function)
+    data = ctypes.cast(weld_ret.data(), POINTER(restype.ctype_class))
+    metrics.run_time = time.time() - start
+    metrics.memory_usage = weld_ret.memory_usage()
+
+    start = time.time()
+    if decode:
+        result = decode_result(decoder, data, restype, weld_ret)
+    else:
+        result = ctypes.cast(data, POINTER(c_int64)).contents.value
+        weld_ret.free()
+    metrics.decode_time = time.time() - start
+    metrics.output_bytes = _nbytes(result, restype.ctype_class)
+    return result
+
+
+class _FieldsDecoder(object):
+    """
+    Decodes each field of a struct with its own decoder, into a list.
+    """
+
+    def __init__(self, decoders):
+        self.decoders = decoders
+        # The fields share one value, which can only be freed if every
+        # decoder tracks its ownership.
+        self.takes_ownership = all(
+            getattr(decoder, "takes_ownership", False) for decoder in decoders)
+
+    def decode(self, data, restype, owner=None):
+        address = ctypes.addressof(data.contents)
+        Struct = restype.ctype_class
+        results = []
+        for i, (decoder, ty) in enumerate(zip(self.decoders,
+                                              restype.field_types)):
+            offset = getattr(Struct, str(i)).offset
+            field = ctypes.cast(address + offset, POINTER(ty.ctype_class))
+            if owner is not None:
+                results.append(decoder.decode(field, ty, owner=owner))
+            else:
+                results.append(decoder.decode(field, ty))
+        return results
+
+
+def _report_metrics(metrics, verbose):
+    if verbose:
+        print metrics
+    callback = _metrics_callback
+    if callback is not None:
+        callback(metrics)
+
+
+def _nbytes(value, ctype):
+    """
+    Returns the size of the input or result `value`, whose ctypes class is
+    `ctype`.
+    """
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is None:
+        nbytes = ctypes.sizeof(ctype)
+    return nbytes
+
+
+_executor = None
+_executor_lock = threading.RLock()
+
+
+def get_executor():
+    """
+    Returns the thread pool used by WeldObject.evaluate_async, creating it on
+    first use. Its size is taken from the WELD_ASYNC_THREADS environment
+    variable, and defaults to the number of CPUs.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            set_executor_threads(
+                int(os.environ.get("WELD_ASYNC_THREADS", 0)) or None)
+        return _executor
+
+
+def set_executor_threads(num_threads=None):
+    """
+    Replaces the thread pool used by WeldObject.evaluate_async with one of
+    `num_threads` threads (the number of CPUs if None). Jobs already submitted
+    to the previous pool still complete.
+    """
+    global _executor
+    if ThreadPoolExecutor is None:
+        raise NotImplementedError(
+            "asynchronous evaluation requires concurrent.futures (install "
+            "the `futures` package on Python 2)")
+    if num_threads is None:
+        num_threads = multiprocessing.cpu_count()
+    with _executor_lock:
+        previous = _executor
+        _executor = ThreadPoolExecutor(max_workers=num_threads)
+    if previous is not None:
+        previous.shutdown(wait=False)
+
+
+# Types of results which decoders always copy.
+_SCALAR_TYPES = (WeldBit, WeldChar, WeldInt, WeldLong, WeldFloat, WeldDouble)
+
+
+def decode_result(decoder, data, restype, weld_ret):
+    """
+    Decodes `data`, which points into the WeldValue `weld_ret`, with
+    `decoder`. If the decoder tracks ownership, `weld_ret` is freed once no
+    decoded object uses it anymore.
+    """
+    if getattr(decoder, "takes_ownership", False):
+        if isinstance(restype, _SCALAR_TYPES):
+            result = decoder.decode(data, restype)
+            weld_ret.free()
+            return result
+        return decoder.decode(data, restype, owner=ResultOwner(weld_ret))
+    return decoder.decode(data, restype)
+
+
+# Maps a tuple of ctypes classes -> the Args class with these fields
+_args_classes = {}
+
+
+def args_factory(argtypes):
+    """
+    Returns a ctypes Structure class whose fields, named _0, _1, ..., have
+    the ctypes classes `argtypes`; this is used to pass arguments to a Weld
+    module. Classes are cached by signature, and values are filled in
+    positionally by calling the class.
+    """
+    argtypes = tuple(argtypes)
+    Args = _args_classes.get(argtypes)
+    if Args is None:
+        class Args(ctypes.Structure):
+            _fields_ = [("_%d" % i, argtype)
+                        for i, argtype in enumerate(argtypes)]
+        _args_classes[argtypes] = Args
+    return Args
+
+
+def run_conf(num_threads=None):
+    """
+    Returns the configuration used to run Weld modules, with `num_threads`
+    threads. By default, the number of threads is taken from the
+    WELD_NUM_THREADS environment variable, or is 1.
+    """
+    conf = cweld.WeldConf()
+    if num_threads is None:
+        num_threads = os.environ.get("WELD_NUM_THREADS", "1")
+    conf.set("weld.threads", str(num_threads))
+    mem_limit = "1000000000000"
+    conf.set("weld.memory.limit", mem_limit)
+    return conf
+
+
+def run_module(module, conf, weld_args, function):
+    """
+    Runs `module` on the arguments in the ctypes Structure `weld_args`, and
+    returns the resulting WeldValue. `function` is the module's program,
+    which is included in error messages.
+    """
+    void_ptr = ctypes.cast(ctypes.byref(weld_args), ctypes.c_void_p)
+    arg = cweld.WeldValue(void_ptr)
+    err = cweld.WeldError()
+    weld_ret = module.run(conf, arg, err)
+    # The argument value only wraps weld_args, which we still own.
+    arg.free()
+    if err.code() != 0:
+        raise ValueError(("Error while running function,\n{}\n\n"
+                          "Error message: {}").format(
+            function, err.message()))
+    return weld_ret
@@ -19,6 +19,7 @@ pub const SIR_OPT_KEY: &'static str = "weld.optimization.sirOptimization";
 pub const LLVM_OPTIMIZATION_LEVEL_KEY: &'static str = "weld.llvm.optimization.level";
 pub const DUMP_CODE_KEY: &'static str = "weld.compile.dumpCode";
 pub const DUMP_CODE_DIR_KEY: &'static str = "weld.compile.dumpCodeDir";
+pub const EXPORT_LLVM_KEY: &'static str = "weld.compile.exportLLVM";
 
 // Default values of each key
 pub const DEFAULT_MEMORY_LIMIT: i64 = 1000000000;
@@ -28,6 +29,7 @@ pub const DEFAULT_SIR_OPT: bool = true;
 pub const DEFAULT_LLVM_OPTIMIZATION_LEVEL: u32 = 2;
 pub const DEFAULT_DUMP_CODE: bool = false;
 pub const DEFAULT_TRACE_RUN: bool = false;
+pub const DEFAULT_EXPORT_LLVM: bool = false;
 
 lazy_static! {
     pub static ref DEFAULT_OPTIMIZATION_PASSES: Vec<Pass> = {
@@ -53,6 +55,7 @@ pub struct ParsedConf {
     pub optimization_passes: Vec<Pass>,
     pub llvm_optimization_level: u32,
     pub dump_code: DumpCodeConf,
+    pub export_llvm: bool,
 }
 
 /// Parse a configuration from a WeldConf key-value dictionary.
@@ -98,6 +101,10 @@ pub fn parse(conf: &WeldConf) -> WeldResult<ParsedConf> {
     let trace_run = value.map(|s| parse_bool_flag(&s, "Invalid flag for trace.run"))
                       .unwrap_or(Ok(DEFAULT_TRACE_RUN))?;
 
+    let value = get_value(conf, EXPORT_LLVM_KEY);
+    let export_llvm = value.map(|s| parse_bool_flag(&s, "Invalid flag for exportLLVM"))
+                      .unwrap_or(Ok(DEFAULT_EXPORT_LLVM))?;
+
     Ok(ParsedConf {
         memory_limit: memory_limit,
         threads: threads,
@@ -109,7 +116,8 @@ pub fn parse(conf: &WeldConf) -> WeldResult<ParsedConf> {
         dump_code: DumpCodeConf {
             enabled: dump_code_enabled,
             dir: dump_code_dir,
-        }
+        },
+        export_llvm: export_llvm,
     })
 }
 
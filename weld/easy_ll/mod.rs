@@ -108,6 +108,8 @@ pub struct CodeDump {
 pub struct Compiled {
    pub module: CompiledModule,
    pub code: Option<CodeDump>,
+   /// The optimized LLVM IR, which can be passed to `compile_optimized_module` later.
+   pub llvm_ir: Option<String>,
    pub timing: LlvmTimingInfo,
 }
 
@@ -143,10 +145,14 @@ pub fn load_library(libname: &str) -> Result<(), LlvmError> {
 /// Compile a string of LLVM IR (in human readable format) into a `CompiledModule` that can then
 /// be executed. The LLVM IR should contain an entry point function called `run` that takes `i64`
 /// and returns `i64`, which will be called by `CompiledModule::run`.
+///
+/// If `export_llvm` is set, the optimized IR is returned as well, so that the module can be
+/// rebuilt later with `compile_optimized_module` without optimizing it again.
 pub fn compile_module(
         code: &str,
         optimization_level: u32,
         dump_code: bool,
+        export_llvm: bool,
         bc_file: Option<&[u8]>)
         -> Result<Compiled, LlvmError> {
 
@@ -206,6 +212,13 @@ pub fn compile_module(
         timing.times.push(("Module Optimization".to_string(), start.to(end)));
         debug!("Done optimizing module");
 
+        // Export the IR before the execution engine takes ownership of the module.
+        let llvm_ir = if export_llvm {
+            Some(output_llvm_ir(module)?)
+        } else {
+            None
+        };
+
         // Create an execution engine for the module and find its run function
         let start = PreciseTime::now();
         let engine = create_exec_engine(module, optimization_level)?;
@@ -232,6 +245,78 @@ pub fn compile_module(
         let result = Compiled {
             module: result,
             code: code,
+            llvm_ir: llvm_ir,
+            timing: timing
+        };
+        Ok(result)
+    }
+}
+
+/// Compile a string of optimized LLVM IR, as exported by `compile_module`, into a
+/// `CompiledModule`. The IR already contains any linked bytecode and has already been optimized,
+/// so it is only verified and handed to the execution engine.
+pub fn compile_optimized_module(
+        code: &str,
+        optimization_level: u32)
+        -> Result<Compiled, LlvmError> {
+
+    let mut timing = LlvmTimingInfo::new();
+
+    unsafe {
+        // Initialize LLVM
+        ONCE.call_once(|| initialize());
+        if INITIALIZE_FAILED {
+            return Err(LlvmError::new("LLVM initialization failed"));
+        }
+
+        // Create an LLVM context
+        let context = llvm::core::LLVMContextCreate();
+        if context.is_null() {
+            return Err(LlvmError::new("LLVMContextCreate returned null"));
+        }
+        debug!("Done creating LLVM context");
+
+        let start = PreciseTime::now();
+        // Create a CompiledModule to wrap the context and our result (will clean it on Drop).
+        let mut result = CompiledModule {
+            context: context,
+            engine: None,
+            run_function: None,
+        };
+
+        // Parse the IR to get an LLVMModuleRef
+        let module = parse_module_str(context, code)?;
+        let end = PreciseTime::now();
+        timing.times.push(("IR Parsing".to_string(), start.to(end)));
+        debug!("Done parsing module");
+
+        // Validate the module
+        let start = PreciseTime::now();
+        verify_module(module)?;
+        check_run_function(module)?;
+        let end = PreciseTime::now();
+        timing.times.push(("Module Verification".to_string(), start.to(end)));
+        debug!("Done validating module");
+
+        // Create an execution engine for the module and find its run function
+        let start = PreciseTime::now();
+        let engine = create_exec_engine(module, optimization_level)?;
+        let end = PreciseTime::now();
+        timing.times.push(("Create Exec Engine".to_string(), start.to(end)));
+        debug!("Done creating execution engine");
+
+        // Find the run function
+        let start = PreciseTime::now();
+        result.engine = Some(engine);
+        result.run_function = Some(find_function(engine, "run")?);
+        let end = PreciseTime::now();
+        timing.times.push(("Find Run Func Address".to_string(), start.to(end)));
+        debug!("Done generating/finding run function");
+
+        let result = Compiled {
+            module: result,
+            code: None,
+            llvm_ir: None,
             timing: timing
         };
         Ok(result)
@@ -1,6 +1,6 @@
 use std::error::Error;
 
-use easy_ll::compile_module;
+use easy_ll::{compile_module, compile_optimized_module};
 
 #[test]
 fn basic_use() {
@@ -15,7 +15,7 @@ fn basic_use() {
            %2 = call i64 @bar(i64 %1)
            ret i64 %2
        }
-    ", 2, false, None);
+    ", 2, false, false, None);
     assert!(module.is_ok());
     assert_eq!(module.unwrap().module.run(42), 44);
 }
@@ -26,7 +26,7 @@ fn compile_error() {
        define ZZZZZZZZ @run(i64 %arg) {
            ret i64 0
        }
-    ", 2, false, None);
+    ", 2, false, false, None);
     assert!(!module.is_ok());
     assert!(module.unwrap_err().description().contains("Compile"));
 }
@@ -37,7 +37,7 @@ fn no_run_function() {
        define i64 @ZZZZZZZ(i64 %arg) {
            ret i64 0
        }
-    ", 2, false, None);
+    ", 2, false, false, None);
     assert!(!module.is_ok());
     assert!(module.unwrap_err().description().contains("run function"));
 }
@@ -48,7 +48,22 @@ fn wrong_function_type() {
        define i64 @run() {
            ret i64 0
        }
-    ", 2, false, None);
+    ", 2, false, false, None);
     assert!(!module.is_ok());
     assert!(module.unwrap_err().description().contains("wrong type"));
 }
+
+#[test]
+fn export_and_reload() {
+    let module = compile_module("
+       define i64 @run(i64 %arg) {
+           %1 = add i64 %arg, 1
+           ret i64 %1
+       }
+    ", 2, false, true, None);
+    assert!(module.is_ok());
+    let llvm_ir = module.unwrap().llvm_ir.unwrap();
+    let module = compile_optimized_module(&llvm_ir, 2);
+    assert!(module.is_ok());
+    assert_eq!(module.unwrap().module.run(42), 43);
+}
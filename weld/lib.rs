@@ -164,6 +164,25 @@ impl CompilationStats {
 
         result
     }
+
+    /// Returns the statistics stored in `self` in a machine-readable form, with one
+    /// `<category>\t<name>\t<microseconds>` line per entry. The categories are `weld`, `passes`
+    /// and `llvm`.
+    pub fn serialize(&self) -> String {
+        let mut result = String::new();
+        let categories = [("weld", &self.weld_times),
+                          ("passes", &self.pass_times),
+                          ("llvm", &self.llvm_times)];
+        for &(category, times) in categories.iter() {
+            for &(ref name, ref dur) in times.iter() {
+                result.push_str(&format!("{}\t{}\t{}\n",
+                                         category,
+                                         name,
+                                         dur.num_microseconds().unwrap_or(0)));
+            }
+        }
+        result
+    }
 }
 
 #[no_mangle]
@@ -334,8 +353,91 @@ pub unsafe extern "C" fn weld_module_compile(code: *const c_char,
 
     debug!("\n{}\n", stats.pretty_print());
 
+    let mut module = module.unwrap();
+    module.set_stats(&stats);
+
     info!("Done weld_module_compile");
-    Box::into_raw(Box::new(module.unwrap()))
+    Box::into_raw(Box::new(module))
+}
+
+#[no_mangle]
+/// Given some Weld code, the optimized LLVM IR of a module previously compiled from the same code
+/// (see `weld_module_llvm_ir`), and a configuration, returns a runnable Weld module. This skips
+/// the optimization passes and code generation `weld_module_compile` runs.
+pub unsafe extern "C" fn weld_module_load(code: *const c_char,
+                                          llvm_ir: *const c_char,
+                                          conf: *const WeldConf,
+                                          err_ptr: *mut WeldError)
+                                          -> *mut WeldModule {
+    info!("Started weld_module_load");
+    assert!(!code.is_null());
+    assert!(!llvm_ir.is_null());
+    assert!(!err_ptr.is_null());
+    let err = &mut *err_ptr;
+
+    let mut stats = CompilationStats::new();
+
+    let conf = conf::parse(&*conf);
+    if let Err(e) = conf {
+        err.errno = WeldRuntimeErrno::ConfigurationError;
+        err.message = CString::new(e.description().to_string()).unwrap();
+        return std::ptr::null_mut();
+    }
+    let conf = conf.unwrap();
+
+    let code = CStr::from_ptr(code);
+    let code = code.to_str().unwrap().trim();
+    let llvm_ir = CStr::from_ptr(llvm_ir);
+    let llvm_ir = llvm_ir.to_str().unwrap();
+
+    let start = PreciseTime::now();
+    let parsed = parser::parse_program(code);
+    let end = PreciseTime::now();
+    stats.weld_times.push(("Parsing".to_string(), start.to(end)));
+
+    if let Err(e) = parsed {
+        err.errno = WeldRuntimeErrno::CompileError;
+        err.message = CString::new(e.description().to_string()).unwrap();
+        return std::ptr::null_mut();
+    }
+
+    let module = llvm::load_program(&parsed.unwrap(), llvm_ir, &conf, &mut stats);
+
+    if let Err(ref e) = module {
+        err.errno = WeldRuntimeErrno::CompileError;
+        err.message = CString::new(e.description().to_string()).unwrap();
+        return std::ptr::null_mut();
+    }
+
+    debug!("\n{}\n", stats.pretty_print());
+
+    let mut module = module.unwrap();
+    module.set_stats(&stats);
+
+    info!("Done weld_module_load");
+    Box::into_raw(Box::new(module))
+}
+
+#[no_mangle]
+/// Returns the optimized LLVM IR of a module, or NULL if the module was compiled without
+/// `weld.compile.exportLLVM` set. The string is owned by the module.
+pub unsafe extern "C" fn weld_module_llvm_ir(module: *mut WeldModule) -> *const c_char {
+    assert!(!module.is_null());
+    let module = &*module;
+    match module.llvm_ir() {
+        Some(ir) => ir.as_ptr() as *const c_char,
+        None => std::ptr::null(),
+    }
+}
+
+#[no_mangle]
+/// Returns the compilation statistics of a module, with one `<category>\t<name>\t<microseconds>`
+/// line per timed step. The categories are `weld` (compiler phases), `passes` (optimization
+/// passes) and `llvm` (LLVM stages). The string is owned by the module.
+pub unsafe extern "C" fn weld_module_stats(module: *mut WeldModule) -> *const c_char {
+    assert!(!module.is_null());
+    let module = &*module;
+    module.stats().as_ptr() as *const c_char
 }
 
 #[no_mangle]
@@ -10,6 +10,7 @@ use time::PreciseTime;
 
 use common::WeldRuntimeErrno;
 
+use std::ffi::CString;
 use std::io::Write;
 use std::path::PathBuf;
 use std::fs::OpenOptions;
@@ -85,6 +86,8 @@ pub struct CompiledModule {
     llvm_module: easy_ll::CompiledModule,
     param_types: Vec<Type>,
     return_type: Type,
+    llvm_ir: Option<CString>,
+    stats: CString,
 }
 
 impl CompiledModule {
@@ -102,6 +105,22 @@ impl CompiledModule {
     pub fn return_type(&self) -> &Type {
         &self.return_type
     }
+
+    /// Returns the optimized LLVM IR of the module, if it was exported when compiling it.
+    pub fn llvm_ir(&self) -> Option<&CString> {
+        self.llvm_ir.as_ref()
+    }
+
+    /// Returns the compilation statistics of the module, as serialized by
+    /// `CompilationStats::serialize`.
+    pub fn stats(&self) -> &CString {
+        &self.stats
+    }
+
+    /// Stores the compilation statistics of the module.
+    pub fn set_stats(&mut self, stats: &CompilationStats) {
+        self.stats = CString::new(stats.serialize()).unwrap_or(CString::default());
+    }
 }
 
 pub fn apply_opt_passes(expr: &mut TypedExpr, opt_passes: &Vec<Pass>, stats: &mut CompilationStats) -> WeldResult<()> {
@@ -187,12 +206,14 @@ pub fn compile_program(program: &Program, conf: &ParsedConf, stats: &mut Compila
         &llvm_code,
         conf.llvm_optimization_level,
         conf.dump_code.enabled,
+        conf.export_llvm,
         Some(WELD_INLINE_LIB)));
     debug!("Done compiling LLVM");
 
     let module = compiled.module;
     let llvm_times = compiled.timing;
     let llvm_op_code = compiled.code;
+    let llvm_ir = compiled.llvm_ir.and_then(|ir| CString::new(ir).ok());
 
     // Add LLVM statistics to the stats.
     for &(ref name, ref time) in llvm_times.times.iter() {
@@ -228,6 +249,51 @@ pub fn compile_program(program: &Program, conf: &ParsedConf, stats: &mut Compila
             llvm_module: module,
             param_types: param_tys.clone(),
             return_type: *return_ty.clone(),
+            llvm_ir: llvm_ir,
+            stats: CString::default(),
+        })
+    } else {
+        unreachable!();
+    }
+}
+
+/// Generate a compiled LLVM module from a program whose body is a function, using optimized LLVM
+/// IR exported from an earlier compilation of the same program. Only type inference runs over the
+/// Weld program (to recover the parameter and return types); none of the optimization passes or
+/// code generation steps are repeated.
+pub fn load_program(program: &Program, llvm_ir: &str, conf: &ParsedConf, stats: &mut CompilationStats)
+        -> WeldResult<CompiledModule> {
+    let mut expr = macro_processor::process_program(program)?;
+
+    let start = PreciseTime::now();
+    uniquify::uniquify(&mut expr)?;
+    type_inference::infer_types(&mut expr)?;
+    let expr = expr.to_typed()?;
+    let end = PreciseTime::now();
+    stats.weld_times.push(("Type Inference".to_string(), start.to(end)));
+
+    debug!("Started loading LLVM");
+    let compiled = try!(easy_ll::compile_optimized_module(llvm_ir, conf.llvm_optimization_level));
+    debug!("Done loading LLVM");
+
+    for &(ref name, ref time) in compiled.timing.times.iter() {
+        stats.llvm_times.push((name.clone(), time.clone()));
+    }
+
+    let start = PreciseTime::now();
+    unsafe {
+        weld_runtime_init();
+    }
+    let end = PreciseTime::now();
+    stats.weld_times.push(("Runtime Init".to_string(), start.to(end)));
+
+    if let Function(ref param_tys, ref return_ty) = expr.ty {
+        Ok(CompiledModule {
+            llvm_module: compiled.module,
+            param_types: param_tys.clone(),
+            return_type: *return_ty.clone(),
+            llvm_ir: CString::new(llvm_ir).ok(),
+            stats: CString::default(),
         })
     } else {
         unreachable!();